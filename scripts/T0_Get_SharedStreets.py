@@ -22,78 +22,181 @@
 # --------------------------------
 
 import arcpy
+import numpy as np
+import math
 import os
-import json
-import urllib.request as urlopen
-import urllib.parse as urlencode
-import urllib.request as request
+import struct
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+try:
+    import ijson
+except ImportError:
+    ijson = None #fall back to parsing each whole response at once
+try:
+    import orjson
+except ImportError:
+    orjson = None #fall back to the standard library json parser used by response.json()
 
 #The shared streets api requires the coordinates to be in geographic coordinates AKA decimal degrees
 #this variable is created to be used when a spatial reference needs to be defined as such
 wgs84 = arcpy.SpatialReference(4326)
 
+#A single session is shared by all requests so the connection to the SharedStreets API is kept alive and reused.
+#Responses are requested gzip compressed; requests decompresses them transparently
+ssSession = requests.Session()
+ssSession.headers.update({'Accept-Encoding': 'gzip, deflate'})
+ssURL = "https://api.sharedstreets.io/v0.1.0/geom/within"
+
 def getPolygon(poly):
-    #location for a temporary file if the data needs to be projected into a geographic coordinate system
-    # output = os.path.join(os.path.dirname(outputFC),"temp")
-    output = os.path.join(arcpy.env.scratchGDB,"temp")
+    queryPolyExtents = []
+
+    #Information about the polygon is obtained once using the Describe method. The spatial reference of the polygon is checked.
+    #If the spatial reference of the geometry is a projected coordinate system, each geometry is changed to a
+    #geographic coordinate system in memory as it is read
+    queryPolyInfo = arcpy.Describe(poly)
+    sr = queryPolyInfo.spatialReference
+    projected = sr.type == "Projected"
 
     #The search cursor is used to get the geometry from the polygon that was drawn on the map.
-    #Information about the polygon is obtained using the Describe method. The spatial reference of the polygon is checked.
-    #If the spatial reference of the geometry is a projected coordinate system, it is changed to a geographic coordinate system
-    #The extent of the polygon is obtained then sent to the sendRequst() function
+    #The extent of the polygon is obtained and collected so every request can be sent at once
     for row in arcpy.da.SearchCursor(poly, ["SHAPE@"]):
-            queryPolyInfo = arcpy.Describe(poly)
-            sr = queryPolyInfo.spatialReference
-            if sr.type == "Projected":
-                arcpy.Project_management(poly,output,wgs84)
-                for row in arcpy.da.SearchCursor(output,["SHAPE@"]):
-                    queryPolyExtent = row[0].extent
-                    sendRequest(queryPolyExtent)
-                arcpy.Delete_management(output)
-                    
-            else:
-                queryPolyExtent = row[0].extent
-                sendRequest(queryPolyExtent)
-    
-#This function sends a request to the SharedStreets API to get the centerlines that intersect with the extent of the input polygon
-def sendRequest(poly):
-    #The url parameters are created. For more info: https://github.com/sharedstreets/sharedstreets-api
-    data = urlencode.urlencode({'authKey':ssKey,'bounds':str(poly.XMin) + "," + str(poly.YMin) + "," + str(poly.XMax) +"," + str(poly.YMax)})
+        queryPoly = row[0]
+        if projected:
+            queryPoly = queryPoly.projectAs(wgs84)
+        queryPolyExtents.append(queryPoly.extent)
 
-    fullURL = "https://api.sharedstreets.io/v0.1.0/geom/within?" + data
-    arcpy.AddMessage(fullURL)
+    #Each extent is split into tiles that are requested from the SharedStreets API concurrently with the sendRequest() function.
+    #Features are handed back through a bounded queue as soon as they are parsed and written by the writeFeatures() function
+    tiles = [tile for queryPolyExtent in queryPolyExtents for tile in tileExtent(queryPolyExtent)]
+    arcpy.AddMessage("Requesting {0} tiles from the SharedStreets API...".format(len(tiles)))
+    #The feature class is created and its insert cursor opened only once for all of the tiles
+    createFC()
+    featureQueue = queue.Queue(maxsize=10000)
+    stopRequests = threading.Event()
+    with arcpy.da.InsertCursor(outputFC,["ssID","SHAPE@"]) as insertCursor:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(sendRequest, tile, featureQueue, stopRequests) for tile in tiles]
+            try:
+                writeFeatures(insertCursor, featureQueue, len(tiles))
+            except BaseException:
+                #If writing fails, the tiles that have not started are cancelled, and the running workers are told to
+                #stop while the queue is drained so none of them stay blocked on a full queue
+                stopRequests.set()
+                for future in futures:
+                    future.cancel()
+                drainQueue(featureQueue, futures)
+                raise
+            #Any error raised while requesting a tile is raised again here
+            for future in futures:
+                future.result()
+
+#This function splits an extent into an n by n grid of (XMin, YMin, XMax, YMax) tiles. n is chosen so that no tile
+#spans more than maxTileSpan decimal degrees, up to maxTiles tiles per side; small extents are requested as one tile
+def tileExtent(extent, maxTileSpan=0.02, maxTiles=4):
+    span = max(extent.XMax - extent.XMin, extent.YMax - extent.YMin)
+    n = min(max(math.ceil(span / maxTileSpan), 1), maxTiles)
+    xs = np.linspace(extent.XMin, extent.XMax, n + 1)
+    ys = np.linspace(extent.YMin, extent.YMax, n + 1)
+    for i in range(n):
+        for j in range(n):
+            yield (xs[i], ys[j], xs[i + 1], ys[j + 1])
+
+#This function sends a request to the SharedStreets API to get the centerlines that intersect with a tile of the extent
+#of the input polygon. It runs in worker threads, so it only puts the features on the queue and leaves the arcpy work to
+#the main thread. None is put on the queue once the tile is finished, even if the request failed, and the tile is
+#abandoned once stopRequests is set
+def sendRequest(tile, featureQueue, stopRequests):
+    #The url parameters are created. For more info: https://github.com/sharedstreets/sharedstreets-api
+    xMin, yMin, xMax, yMax = tile
+    #Bounds are rounded to 7 decimal places (about 1 cm), which keeps the urls short
+    data = {'authKey':ssKey,'bounds':f"{xMin:.7f},{yMin:.7f},{xMax:.7f},{yMax:.7f}"}
 
-    #The request is sent, and the data is parsed from string to json.  Only the features are sent to the createFC() function.
+    #The request is sent, and the data is parsed from string to json.  Only the features are put on the queue.
     #Additional information is provided, but that information is not relevant to this process
-    req = request.Request(fullURL)
-    response = urlopen.urlopen(req)
-    response_bytes = response.read()
-    ssFeatures = json.loads(response_bytes.decode('UTF-8'))["features"]
-    createFC(ssFeatures)
-
-#This function interates over the JSON representations of lines to create polylines which are subsequently inserted into a new feature class
-def createFC(features):
+    response = None
+    try:
+        response = ssSession.get(ssURL, params=data, timeout=30, stream=True)
+        response.raise_for_status()
+        if ijson is not None:
+            #The response is parsed while it is downloaded, so only one feature at a time is held in memory
+            response.raw.decode_content = True
+            features = ijson.items(response.raw, "features.item", use_float=True)
+        elif orjson is not None:
+            features = orjson.loads(response.content)["features"]
+        else:
+            features = response.json()["features"]
+        for feature in features:
+            if stopRequests.is_set():
+                break
+            featureQueue.put(feature)
+    finally:
+        if response is not None:
+            response.close()
+        featureQueue.put(None)
+
+#This function empties the queue until every request has finished, so that no worker thread stays blocked putting
+#features on a full queue after writeFeatures() has stopped reading it
+def drainQueue(featureQueue, futures):
+    while not all(future.done() for future in futures):
+        try:
+            featureQueue.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+#This function packs a list of [x, y] coordinates into the WKB representation of a 2D LineString (little-endian)
+#so that polylines can be created with arcpy.FromWKB instead of building an arcpy.Point for every vertex. A ValueError
+#is raised when the coordinates do not form a regular array, e.g. when 2D and 3D coordinates are mixed
+def coords_to_wkb(coords):
+    #An empty list of coordinates becomes an empty (0, 2) array
+    coordArray = np.asarray(coords, dtype='<f8').reshape(-1, len(coords[0]) if len(coords) else 2)
+    if coordArray.shape[1] < 2:
+        raise ValueError("Coordinates need at least an x and a y value.")
+    #Only coordinates with z or m values need to be sliced down to x and y (and copied)
+    if coordArray.shape[1] != 2:
+        coordArray = np.ascontiguousarray(coordArray[:, :2])
+    return struct.pack('<BII', 1, 2, len(coordArray)) + coordArray.tobytes()
+
+#This function creates a polyline from a list of coordinates through its WKB, and falls back to building it point by
+#point when the coordinates are irregular
+def coords_to_polyline(coords, sr):
+    try:
+        return arcpy.FromWKB(bytearray(coords_to_wkb(coords)), sr)
+    except ValueError:
+        return arcpy.Polyline(arcpy.Array([arcpy.Point(*coord) for coord in coords]), sr)
+
+#This function creates the empty output feature class that writeFeatures() inserts into
+def createFC():
     #Create feature class with a polyline geometry type
     arcpy.CreateFeatureclass_management(os.path.dirname(outputFC),os.path.basename(outputFC),"POLYLINE","","","",wgs84)
     #Add field to the feature class that will contain the Shared Streets ID of the polyline
     arcpy.AddField_management(outputFC,"ssID","TEXT")
 
-    #Create insert cursor that will be used to add data to the feature class
-    insertCursor = arcpy.da.InsertCursor(outputFC,["ssID","SHAPE@"])
-    #Loop through the JSON features to create proper polylines
-    for feature in features:
-        stringCoords = feature["geometry"]["coordinates"]
-        polylineArray = arcpy.Array()
-        for stringCoord in stringCoords:
-            #Each polyline is an array of Point geometry objects.  Each point has a latitude and longitude value.
-            polylineArray.append(arcpy.Point(float(stringCoord[0]),float(stringCoord[1])))
-        #The polyline is created from the array of Point geometry objects
-        polyline = arcpy.Polyline(polylineArray,wgs84)
+#This function takes the JSON representations of lines off the queue as they arrive to create polylines which are
+#subsequently inserted into the feature class with the given insert cursor, until every tile has been finished.
+#Only the main thread writes, so the cursor needs no lock
+def writeFeatures(insertCursor, featureQueue, tileCount):
+    #The insertRow method is looked up once rather than for every feature
+    insertRow = insertCursor.insertRow
+    #Centerlines crossing tile edges are returned for every tile they touch, so they are only inserted once
+    ssIDs = set()
+    finishedTiles = 0
+    while finishedTiles < tileCount:
+        feature = featureQueue.get()
+        if feature is None:
+            finishedTiles += 1
+            continue
         #The Shared Streets ID obtained from the JSON representation of the feature
         id = feature["properties"]["id"]
+        if id in ssIDs:
+            continue
+        ssIDs.add(id)
+        stringCoords = feature["geometry"]["coordinates"]
+        #The polyline is created from the WKB of its coordinates.  Each point has a longitude and latitude value.
+        polyline = coords_to_polyline(stringCoords,wgs84)
         #The polyline and Shared Streets ID are added to the feature class
-        insertCursor.insertRow((id,polyline))
-    del insertCursor
+        insertRow((id,polyline))
 
 
 
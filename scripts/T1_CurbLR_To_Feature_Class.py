@@ -23,11 +23,21 @@
 # --------------------------------
 # Import Modules
 import arcpy
-import pandas as pd
-from pandas.io.json import json_normalize
 import numpy as np
 import os
 import json
+import struct
+import functools
+import contextlib
+import datetime
+try:
+    import ijson
+except ImportError:
+    ijson = None # fall back to reading the whole document into memory
+try:
+    import orjson
+except ImportError:
+    orjson = None # fall back to the standard library json parser
 # import curbsidelib as csl
 
 # functions from former curbsidelib
@@ -44,6 +54,170 @@ def arc_print(string, progressor_bool=False):
 
 sr_wgs = arcpy.SpatialReference(4326) # GeoJSON coordinates are always in WGS 84 https://tools.ietf.org/html/rfc7946#section-4
 
+# timesOfDay_from_dt and timesOfDay_to_dt are written as datetimes on the day of week of each duplicate feature
+# We use a dict to convert each two-letter day abbreviation into an int (1-7), the day of January 1900
+# We use year 1900 because it started on a Monday and I (Drew) believe Monday is the first day of the week :)
+# See https://en.wikipedia.org/wiki/Common_year_starting_on_Monday
+day_dict = {'mo': 1,
+            'tu': 2,
+            'we': 3,
+            'th': 4,
+            'fr': 5,
+            'sa': 6,
+            'su': 7}
+day_dates = {day: datetime.datetime(1900, 1, day_number) for day, day_number in day_dict.items()}
+
+fields = [['SharedStreetID', 'TEXT'],
+          ['effectiveDates_from', 'TEXT'], # was DATE but we want time slider functionality to default to timesOfDay_from_dt
+          ['effectiveDates_to', 'TEXT'], # was DATE
+          ['daysOfWeek', 'TEXT'], # will be a comma-separated list of two-letter day abbreviations
+          ['timesOfDay_from', 'TEXT'],
+          ['timesOfDay_to', 'TEXT'],
+          ['timesOfDay_from_dt', 'DATE'],
+          ['timesOfDay_to_dt', 'DATE'],
+          ['activity', 'TEXT'],
+          ['priorityCategory', 'TEXT'],
+          ['maxStay', 'SHORT'],
+        #   ['noReturn', 'SHORT'], # dropped this field from our schema because it is almost never used and almost useless
+          ['payment', 'SHORT'],
+          ['warnings', 'TEXT'],
+          ['primary', 'SHORT']]
+
+def iter_curblr_features(json_path):
+    """Yields the features of a CurbLR JSON file one at a time. If ijson is installed the file is parsed
+    incrementally, so only one feature is held in memory at once; otherwise the whole file is read with orjson
+    (or json.load if orjson is not installed either).
+    @:param json_path - file path to .json file containing input CurbLR data"""
+    if ijson is not None:
+        with open(json_path, 'rb') as json_file:
+            for feature in ijson.items(json_file, 'features.item', use_float=True):
+                yield feature
+    else:
+        if orjson is not None:
+            with open(json_path, 'rb') as json_file:
+                data = orjson.loads(json_file.read())
+        else:
+            with open(json_path) as json_file:
+                data = json.load(json_file)
+        for feature in data['features']:
+            yield feature
+
+def coords_to_wkb(xys):
+    """Packs a list of [x, y] coordinate pairs into the little-endian WKB representation of a 2D LineString,
+    so that geometries can be built without creating an arcpy.Point per vertex. Raises ValueError when the
+    coordinates do not form a regular array, e.g. when 2D and 3D coordinates are mixed.
+    @:param xys - list of [x, y] (or [x, y, z]) coordinate pairs"""
+    # one C-level conversion of the nested lists; an empty list becomes an empty (0, 2) array
+    coords = np.asarray(xys, dtype='<f8').reshape(-1, len(xys[0]) if len(xys) else 2)
+    if coords.shape[1] < 2:
+        raise ValueError("Coordinates need at least an x and a y value.")
+    if coords.shape[1] != 2: # drop z/m values; 2D input (the common case) needs no further copy
+        coords = np.ascontiguousarray(coords[:, :2])
+    return struct.pack('<BII', 1, 2, len(coords)) + coords.tobytes() # byte order, geometry type, point count
+
+def xy_to_polyline(xys, sr):
+    try:
+        return arcpy.FromWKB(bytearray(coords_to_wkb(xys)), sr)
+    except ValueError:
+        # irregular coordinates are built point by point instead
+        return arcpy.Polyline(arcpy.Array([arcpy.Point(*coords) for coords in xys]), sr)
+
+@functools.lru_cache(maxsize=None)
+def clean_days_of_week(days):
+    """Returns a cleaned-up tuple of a CurbLR daysOfWeek tuple of two-letter day abbreviations. Datasets only use
+    a handful of distinct day combinations, so results are cached and each combination is only cleaned once.
+    See CurbLR_to_FC.ipynb for exploratory analysis used to design this approach
+    @:param days - tuple of day abbreviations from a CurbLR timeSpan"""
+    cleaned_days = []
+    for day in days:
+        day = str(day).replace(' ', '')
+        # Perform four replacements that together address the nine "problem patterns" found in the LA CurbLR dataset
+        if day == 'm':
+            day = 'mo'
+        elif day == 's':
+            day = 'su'
+        elif day == 't' and cleaned_days and cleaned_days[-1] == 'mo':
+            day = 'tu'
+        elif day == 't' and cleaned_days and cleaned_days[-1] == 'we':
+            day = 'th'
+        cleaned_days.append(day)
+    return tuple(cleaned_days)
+
+@functools.lru_cache(maxsize=None)
+def parse_time_of_day(time_of_day):
+    """Converts a CurbLR HH:MM time of day into a timedelta since midnight, or None if it cannot be parsed.
+    Times like 24:00 roll over into the next day.
+    @:param time_of_day - a text string in the form HH:MM (seconds are optional)"""
+    try:
+        values = [float(i) for i in time_of_day.split(':')]
+    except (AttributeError, ValueError):
+        return None
+    while len(values) < 3:
+        values.append(0)
+    hours, minutes, seconds = values[:3]
+    return datetime.timedelta(hours=hours, minutes=minutes, seconds=seconds)
+
+def iter_rows(feature):
+    """Yields one row (geometry followed by the values of each field in fields) per timeSpan and day of week
+    of a CurbLR feature, ready to be passed to an InsertCursor.
+    @:param feature - dict of a single CurbLR GeoJSON feature"""
+    # These extractions are mandatory: without the geometry, the output would be useless
+    # Therefore we do not guard them against missing keys
+    geom = xy_to_polyline(feature['geometry']['coordinates'], sr_wgs)
+    properties = feature['properties']
+    shared_street_id = (properties.get('location') or {}).get('shstRefId')
+
+    for regulation in properties['regulations']:
+        # The following extractions are optional: the tool should run even if they're missing from the input data
+        rule = regulation.get('rule') or {}
+        activity = rule.get('activity')
+        priority_category = rule.get('priorityCategory')
+        # SHORT fields get plain ints so the cursor never has to convert floats or strings
+        try:
+            max_stay = int(rule.get('maxStay'))
+        except (TypeError, ValueError):
+            max_stay = -1 # fill missing maxStay with magic value -1
+        # Assume missing payment information means no payment is required
+        payment = 1 if regulation.get('payment') is not None else 0
+
+        # A regulation without timeSpans is always in effect, so it is expanded as a single empty timeSpan that
+        # falls back to all days and all times of day below
+        for time_span in regulation.get('timeSpans') or [{}]:
+            times_of_day = (time_span.get('timesOfDay') or [{}])[0]
+            times_of_day_from = times_of_day.get('from')
+            times_of_day_to = times_of_day.get('to')
+            effective_dates = (time_span.get('effectiveDates') or [{}])[0]
+
+            # Document and handle missingness in date/time fields
+            warnings = ''
+            days = (time_span.get('daysOfWeek') or {}).get('days')
+            if days:
+                days = clean_days_of_week(tuple(days))
+            else:
+                warnings += 'daysOfWeek missing;'
+                days = ['mo', 'tu', 'we', 'th', 'fr', 'sa', 'su'] # set missing daysOfWeek to be all days
+            if times_of_day_from is None:
+                warnings += 'timesOfDay missing;'
+                times_of_day_from = '0:00' # set missing timesOfDay_from to 0:00
+            if times_of_day_to is None:
+                times_of_day_to = '23:59' # set missing timesOfDay_to to 23:59
+            time_delta_from = parse_time_of_day(times_of_day_from)
+            time_delta_to = parse_time_of_day(times_of_day_to)
+
+            # Values shared by every duplicate feature of this timeSpan are packed once
+            shared_head = (geom, shared_street_id, effective_dates.get('from'), effective_dates.get('to'),
+                           ','.join(days), times_of_day_from, times_of_day_to)
+            shared_tail = (activity, priority_category, max_stay, payment, warnings)
+
+            # Create duplicate features for each dayOfWeek (so that time sliders work well on all days)
+            # Only the zeroth duplicate feature is set as primary
+            for index, day in enumerate(days):
+                # Use dayOfWeek for the date of both timesOfDay_from_dt and timesOfDay_to_dt
+                day_date = day_dates.get(day)
+                from_dt = day_date + time_delta_from if day_date is not None and time_delta_from is not None else None
+                to_dt = day_date + time_delta_to if day_date is not None and time_delta_to is not None else None
+                yield shared_head + (from_dt, to_dt) + shared_tail + (int(index == 0),)
+
 def convert_curblr_to_feature_class(json_path, out_path, out_sr=sr_wgs):
     """This tool reads in a CurbLR-compliant JSON file and converts it into a 
     temporally enabled stacked feature class of curbside regulations.
@@ -54,171 +228,64 @@ def convert_curblr_to_feature_class(json_path, out_path, out_sr=sr_wgs):
     arcpy.env.overwriteOutput = True # not necessary?
     out_dir = os.path.dirname(out_path)
     out_fc_name = os.path.basename(out_path)
+    # Describe out_dir once; it tells us both the default spatial reference and the edit workspace
+    out_dir_info = arcpy.Describe(out_dir)
+    out_dir_is_dataset = out_dir_info.dataType == 'FeatureDataset'
     if out_sr == '': # if no spatial reference is specified...
-        try: # extract it from out_dir if that is a feature dataset
-            out_sr = arcpy.Describe(out_dir).spatialReference
-        except Exception: # if out_dir is not a feature dataset, fall back to WGS 84
+        if out_dir_is_dataset: # extract it from out_dir if that is a feature dataset
+            out_sr = out_dir_info.spatialReference
+        else: # if out_dir is not a feature dataset, fall back to WGS 84
             out_sr = sr_wgs
 
-    # Read in JSON object
-    with open(json_path) as json_file:
-        data = json.load(json_file)
-
-    # Use pandas json_normalize to create DataFrame
-    df = json_normalize(data['features'], ['properties', 'regulations', 'timeSpans'], 
-                        ['geometry', ['properties', 'location'], 
-                        ['properties', 'regulations', 'rule'], 
-                        ['properties', 'regulations', 'payment']],
-                        errors = 'ignore')
-    arc_print('Read in {} features from CurbLR JSON...'.format(len(df)))
-
-    # Define helper functions for DataFrame manipulation
-    def xy_to_polyline(xys, sr):
-        return arcpy.Polyline(arcpy.Array([arcpy.Point(*coords) for coords in xys]), sr)
-
-    def get_item_zero(column): # just here to handle errors when data are missing
-        try:
-            return column[0]
-        except:
-            return None
-
-    def extract(column, field):
-        try:
-            return column[field]
-        except:
-            return None
-
-    # Apply several vectorized functions to extract desired fields
-    # This first group of extractions is mandatory: without these fields, the output would be useless
-    # Therefore we do not wrap them in try/except expressions
-    df['coordinates'] = df['geometry'].apply(extract, args = ['coordinates'])
-    df['geom'] = df['coordinates'].apply(xy_to_polyline, args = [sr_wgs])
-    for field in ['activity', 'priorityCategory', 'maxStay']:
-        df[field] = df['properties.regulations.rule'].apply(extract, args = [field])
-    df['maxStay'] = df['maxStay'].fillna(-1) # fill missing maxStay with magic value -1
-
-    # The following extractions are optional: the tool should run even if they're missing from the input data
-    # Therefore they get try/except expressions, one for each expected field
-    try:
-        df['timesOfDay_from'] = df['timesOfDay'].apply(lambda x: extract(get_item_zero(x), 'from'))
-        df['timesOfDay_to'] = df['timesOfDay'].apply(lambda x: extract(get_item_zero(x), 'to'))
-    except KeyError:
-        df['timesOfDay_from'] = None
-        df['timesOfDay_to'] = None
-    try:
-        df['effectiveDates_from'] = df['effectiveDates'].apply(lambda x: extract(get_item_zero(x), 'from'))
-        df['effectiveDates_to'] = df['effectiveDates'].apply(lambda x: extract(get_item_zero(x), 'to'))
-    except KeyError:
-        df['effectiveDates_from'] = None
-        df['effectiveDates_to'] = None
-    try:
-        df['SharedStreetID'] = df['properties.location'].apply(extract, args = ['shstRefId'])
-    except KeyError:
-        df['SharedStreetID'] = None
-    try:
-        df['payment'] = df['properties.regulations.payment'].apply(lambda x: 1 if x is not np.nan else 0)
-    except KeyError:
-        df['payment'] = 0 # Assume missing payment information means no payment is required
-
-    # Prepare a string-formatted, cleaned-up version of daysOfWeek
-    # See CurbLR_to_FC.ipynb for exploratory analysis used to design this approach
-    # Create string version of column of lists
-    if 'daysOfWeek.days' in df.columns: # different versions of pandas unpack via json_normalize differently!
-        df['daysOfWeek'] = df['daysOfWeek.days'].astype(str)
-    else:
-        df['daysOfWeek'] = df['daysOfWeek'].apply(extract, args = ['days'])
-        df['daysOfWeek'] = df['daysOfWeek'].astype(str)
-    # Remove characters other than quotation marks, letters, and commas
-    df['daysOfWeek'] = df['daysOfWeek'].str.strip('[]')
-    df['daysOfWeek'] = df['daysOfWeek'].str.replace(" ", '')
-    # Perform four replacements that together address the nine "problem patterns" found in the LA CurbLR dataset
-    df['daysOfWeek'] = df['daysOfWeek'].str.replace("'m'", "'mo'")
-    df['daysOfWeek'] = df['daysOfWeek'].str.replace("'mo','t'", "'mo','tu'")
-    df['daysOfWeek'] = df['daysOfWeek'].str.replace("'we','t'", "'we','th'")
-    df['daysOfWeek'] = df['daysOfWeek'].str.replace("'s'", "'su'")
-    # Remove quotation marks
-    df['daysOfWeek'] = df['daysOfWeek'].str.replace("'", '')
-
-    # Document and handle missingness in date/time fields
-    df['warnings'] = '' # start with blank field to house warnings
-    df.loc[df['daysOfWeek'].isin(['nan', 'None']), 'warnings'] += 'daysOfWeek missing;'
-    df.loc[df['daysOfWeek'].isin(['nan', 'None']), 'daysOfWeek'] = 'mo,tu,we,th,fr,sa,su' # set missing daysOfWeek to be all days
-
-    df.loc[df['timesOfDay_from'].isna(), 'warnings'] += 'timesOfDay missing;'
-    df['timesOfDay_from'] = df['timesOfDay_from'].fillna('0:00') # set missing timesOfDay_from to 0:00
-    df['timesOfDay_to'] = df['timesOfDay_to'].fillna('23:59') # set missing timesOfDay_to to 23:59
-
-    # Create duplicate features for each dayOfWeek (so that time sliders work well on all days)
-    # Approach adapted from https://medium.com/@sureshssarda/pandas-splitting-exploding-a-column-into-multiple-rows-b1b1d59ea12e
-    # In pandas 0.25 and above, df.explode() would also work well
-    new_df = pd.DataFrame(df['daysOfWeek'].str.split(',').tolist()).stack()
-    new_df = new_df.reset_index(level = 1) # stack() creates a MultiIndex; this kicks one MultiIndex level out into a column
-    new_df.columns = ['primary', 'dayOfWeek'] # rename columns appropriately
-    new_df['primary'] = (new_df['primary'] == 0).astype(int) # set only the zeroth duplicate feature as primary
-    df = df.join(new_df) # join columns onto original DataFrame
-
-    # Prepare datetime fields
-    # 'mm/dd/yyyy hh:mm' parses effectively in ArcGIS, so we need to convert daysOfWeek into dd
-    # Then we can just concatenate timesOfDay onto that
-    # We use a dict to convert the first (string) entry in daysOfWeek into an int (1-7)
-    # We use year 1900 because it started on a Monday and I (Drew) believe Monday is the first day of the week :)
-    # See https://en.wikipedia.org/wiki/Common_year_starting_on_Monday
-
-    day_dict = {'mo': '1',
-                'tu': '2',
-                'we': '3',
-                'th': '4',
-                'fr': '5',
-                'sa': '6',
-                'su': '7'}
-
-    # Use dayOfWeek for the date of both timesOfDay_from_dt and timesOfDay_to_dt
-    df['timesOfDay_from_dt'] = '1/' + df['dayOfWeek'].map(day_dict) + '/1900 '+ df['timesOfDay_from']
-    df['timesOfDay_to_dt'] = '1/' + df['dayOfWeek'].map(day_dict) + '/1900 '+ df['timesOfDay_to']
-
-    arc_print('Ready to export {} features (including duplicates) to feature class...'.format(len(df)))
-
     # Create feature class and add desired fields
     if arcpy.Exists(out_path): # manually delete existing data if necessary; theoretically arcpy.env.overwriteOutput should cover this but it often fails
         arcpy.management.Delete(out_path)
         
     arcpy.management.CreateFeatureclass(out_dir, out_fc_name, 'POLYLINE', spatial_reference = out_sr)
 
-    fields = [['SharedStreetID', 'TEXT'],
-              ['effectiveDates_from', 'TEXT'], # was DATE but we want time slider functionality to default to timesOfDay_from_dt
-              ['effectiveDates_to', 'TEXT'], # was DATE
-              ['daysOfWeek', 'TEXT'], # will be a comma-separated list of two-letter day abbreviations
-              ['timesOfDay_from', 'TEXT'],
-              ['timesOfDay_to', 'TEXT'],
-              ['timesOfDay_from_dt', 'DATE'],
-              ['timesOfDay_to_dt', 'DATE'],
-              ['activity', 'TEXT'],
-              ['priorityCategory', 'TEXT'],
-              ['maxStay', 'SHORT'],
-            #   ['noReturn', 'SHORT'], # dropped this field from our schema because it is almost never used and almost useless
-              ['payment', 'SHORT'],
-              ['warnings', 'TEXT'],
-              ['primary', 'SHORT']]
-
     for field, dtype in fields:
         arcpy.management.AddField(out_path, field, dtype)
     arc_print('Created output feature class {}...'.format(out_fc_name))
 
-    # Clean up DataFrame fields
+    # Edit sessions are opened on the geodatabase, not on a feature dataset within it. Only geodatabases support
+    # them, so outputs in memory or in a folder (shapefiles) are written without one
+    out_workspace = os.path.dirname(out_dir) if out_dir_is_dataset else out_dir
+    in_memory = out_workspace.lower() in ('memory', 'in_memory')
+    use_edit_session = not in_memory and \
+        arcpy.Describe(out_workspace).workspaceType in ('LocalDatabase', 'RemoteDatabase')
+
+    # Stream CurbLR features through iter_rows straight into the InsertCursor,
+    # so that the whole document never has to be held in memory at once
+    # All inserts share one edit session in a geodatabase, and the spatial index is built once afterwards
+    # instead of being maintained on every insert
     columns = [field[0] for field in fields]
-    df = df[['geom'] + columns]
-
-    # Use InsertCursor to write DataFrame to feature class
-    with arcpy.da.InsertCursor(out_path, ['SHAPE@'] + columns) as cursor:
-        i = 0
-        for index, row in df.iterrows(): # .iterrows() is "slow" but plenty fast for this application
-            values = [row[column] for column in columns]
-            cursor.insertRow([row['geom']] + values)
-            i += 1
-            if not i % 10000: # every 10000 original rows, print update message
-                arc_print('Wrote {} features...'.format(i))
-                
-    arc_print('Wrote {} features total...'.format(len(df)))
+    feature_count, row_count = 0, 0
+    maintain_spatial_index = arcpy.env.maintainSpatialIndex
+    arcpy.env.maintainSpatialIndex = False
+    try:
+        with contextlib.ExitStack() as edit_stack:
+            if use_edit_session:
+                edit_stack.enter_context(arcpy.da.Editor(out_workspace))
+            cursor = edit_stack.enter_context(arcpy.da.InsertCursor(out_path, ['SHAPE@'] + columns))
+            insert_row = cursor.insertRow # bind once; rows from iter_rows are already plain tuples in cursor order
+            for feature in iter_curblr_features(json_path):
+                feature_count += 1
+                for row in iter_rows(feature):
+                    insert_row(row)
+                    row_count += 1
+                    if not row_count % 10000: # every 10000 rows, print update message
+                        arc_print('Wrote {} features...'.format(row_count))
+    finally:
+        arcpy.env.maintainSpatialIndex = maintain_spatial_index
+    # memory feature classes have no spatial index, and any other workspace that does not support one is skipped
+    if not in_memory:
+        try:
+            arcpy.management.AddSpatialIndex(out_path)
+        except arcpy.ExecuteError:
+            arc_print('Could not add a spatial index to {}, skipping it...'.format(out_fc_name))
+
+    arc_print('Read in {} features from CurbLR JSON...'.format(feature_count))
+    arc_print('Wrote {} features total (including duplicates)...'.format(row_count))
     arc_print("Script complete...")
 
 # This test allows the script to be used from the operating system 
@@ -64,32 +64,100 @@ def add_new_field(in_table, field_name, field_type, field_precision="#", field_s
                                   field_is_nullable, field_is_required, field_domain)
         return True # True because field was added
 
-def create_route_field(in_table, route_field, field_type='LONG'):
+def create_route_field(in_table, route_field, field_type='LONG', oid_field=None):
+    """Add a route field to a table if it does not exist yet and populate it with the table's OIDs.
+    :param - oid_field - OID field name of in_table, if already known (it is looked up otherwise)"""
     if add_new_field(in_table, route_field, field_type):
-        oid_field = arcpy.Describe(in_table).OIDFieldName
+        if oid_field is None:
+            oid_field = arcpy.Describe(in_table).OIDFieldName
         arcpy.management.CalculateField(in_table, route_field, "!{}!".format(oid_field))
         arc_print('Populated field {} with content of field {}'.format(route_field, oid_field))
         return True # True because field was created
     arc_print('Did not modify content of field {}'.format(route_field))
     return False # False because field was not created
 
-def arcgis_table_to_df(in_fc, input_fields=None, query=""):
-    """Function will convert an arcgis table into a pandas dataframe with an object ID index, and the selected
-    input fields using an arcpy.da.SearchCursor.
-    :param - in_fc - input feature class or table to convert
-    :param - input_fields - fields to input to a da search cursor for retrieval
-    :param - query - sql query to grab appropriate values
-    :returns - pandas.DataFrame"""
-    OIDFieldName = arcpy.Describe(in_fc).OIDFieldName
-    if input_fields:
-        final_fields = [OIDFieldName] + input_fields
-    else:
-        final_fields = [field.name for field in arcpy.ListFields(in_fc)]
-    data = [row for row in arcpy.da.SearchCursor(in_fc, final_fields, where_clause=query)]
-    fc_dataframe = pd.DataFrame(data, columns=final_fields)
-    fc_dataframe = fc_dataframe.set_index(OIDFieldName, drop=True)
-    return fc_dataframe
+def df_to_structured_array(df):
+    """Converts a dataframe to a NumPy structured array that arcpy.da can write, with one field per column.
+    :param - df - dataframe to convert
+    :returns - numpy structured array"""
+    arrays = []
+    for column_name, column in df.items():
+        if column.dtype == bool:
+            arrays.append(column.to_numpy(dtype="i4"))
+        elif column.dtype.kind in "iu" and column.hasnans:
+            arrays.append(column.to_numpy(dtype=float, na_value=np.nan)) # integer gaps are written as NaN
+        elif column.dtype.kind in "iufmM":
+            arrays.append(column.to_numpy())
+        else:
+            # unicode fields cannot hold nulls; restore_text_nulls writes them back after the join
+            arrays.append(column.fillna("").astype(str).to_numpy(dtype=str))
+    return np.rec.fromarrays(arrays, names=[str(column_name) for column_name in df.columns]).view(np.ndarray)
+
+def restore_text_nulls(df, target_feature_class, df_join_field, feature_class_join_field):
+    """Sets the text fields joined from a dataframe back to null where df_to_structured_array wrote empty strings.
+    @:param - df - dataframe that was joined, with its columns named like the joined fields
+    @:param - target_feature_class - the feature class the data was joined to
+    @:param - df_join_field - field in dataframe the join was based on
+    @:param - feature_class_join_field - feature class field the join was based on"""
+    text_columns = [name for name, column in df.items() if name != df_join_field and column.dtype != bool
+                    and column.dtype.kind not in "iufmM" and column.hasnans]
+    if not text_columns:
+        return
+    null_flags = df[text_columns].isna()
+    null_rows = null_flags.any(axis=1).to_numpy()
+    null_dict = dict(zip(df[df_join_field].to_numpy()[null_rows].tolist(),
+                         null_flags.to_numpy()[null_rows].tolist()))
+    with arcpy.da.UpdateCursor(target_feature_class, [feature_class_join_field] + text_columns) as cursor:
+        for row in cursor:
+            flags = null_dict.get(row[0])
+            if flags:
+                cursor.updateRow([row[0]] + [None if is_null else value for value, is_null in zip(row[1:], flags)])
+
+# NumPy types that keep the width of integer fields when they are written through a structured array
+integer_field_types = {'Integer': 'i4', 'SmallInteger': 'i2'}
 
+def join_fields_with_numpy(in_table, in_field, join_table, join_field, fields):
+    """Join fields from join_table onto in_table in place with arcpy.da.ExtendTable instead of JoinField.
+    :param - in_table - table or feature class to join fields onto
+    :param - in_field - key field of in_table
+    :param - join_table - table or feature class with the fields to join
+    :param - join_field - key field of join_table
+    :param - fields - names of the join_table fields to join"""
+    in_table_fields = {field.name.lower(): field for field in arcpy.ListFields(in_table)}
+    # fields that cannot be held in an array, and fields already in in_table, are skipped
+    join_fields = [field for field in arcpy.ListFields(join_table) if field.name in fields
+                   and field.type not in ("OID", "Geometry", "Blob", "Raster", "GlobalID", "Guid")
+                   and field.name.lower() not in in_table_fields and field.name != join_field]
+    if not join_fields:
+        return
+    field_names = [field.name for field in join_fields]
+    with arcpy.da.SearchCursor(join_table, [join_field] + field_names) as cursor:
+        join_df = pd.DataFrame.from_records(cursor, columns=[join_field] + field_names)
+    join_df = join_df[join_df[join_field].notna()]
+    array_fields, cursor_join_fields = [], []
+    # integer and date fields that hold nulls cannot be written through an array, so only those use JoinField
+    for field in join_fields:
+        if field.type in integer_field_types or field.type == 'Date':
+            if join_df[field.name].isna().any():
+                cursor_join_fields.append(field.name)
+                continue
+            if field.type == 'Date':
+                join_df[field.name] = pd.to_datetime(join_df[field.name])
+            else:
+                join_df[field.name] = join_df[field.name].astype(integer_field_types[field.type])
+        array_fields.append(field.name)
+    if array_fields:
+        join_df = join_df[[join_field] + array_fields]
+        # the join keys must have the same type as the in_table field, e.g. integer IDs that were read as floats
+        if in_table_fields[in_field.lower()].type in ("OID", "Integer", "SmallInteger"):
+            join_df[join_field] = join_df[join_field].astype("i4")
+        arcpy.da.ExtendTable(in_table, in_field, df_to_structured_array(join_df), join_field, append_only=False)
+        restore_text_nulls(join_df, in_table, join_field, in_field)
+    if cursor_join_fields:
+        arcpy.management.JoinField(in_table, in_field, join_table, join_field, cursor_join_fields)
+
+# Meters per bandwidth unit; Feet are US survey feet, like the FEET_US length unit
+bandwidth_unit_meters = {'Feet': 1200 / 3937, 'Meters': 1.0}
 
 def prepare_lr_correspondence(in_centerlines, in_curb_features,
                               out_route_centerlines, out_route_curb_features,
@@ -114,63 +182,95 @@ def prepare_lr_correspondence(in_centerlines, in_curb_features,
     @:param angle_threshold - maximum effective "angle" (in degrees) between
         centerlines and curbside regulation features"""
     # Set parameters and options
+    curb_features_layer = 'curb_features_layer'
     mem_curb_features = 'mem_curb_features'
     mem_curb_features_matched = 'mem_curb_features_matched'
-    mem_table = 'memory/mem_table' # just 'mem_table' doesn't work: "invalid table name" for some reason
     mem_vertices = 'mem_vertices'
     mem_located = 'mem_located'
     arcpy.env.overwriteOutput = True
     arcpy.env.workspace = 'memory'
 
+    # Describe both inputs once up front and reuse their OID field names and field lists below
+    centerline_info = arcpy.Describe(in_centerlines)
+    in_centerline_fields = [field.name for field in centerline_info.fields]
+    curb_feature_info = arcpy.Describe(in_curb_features)
+
     # Convert centerlines FC to routes FC
     if arcpy.Exists(out_route_centerlines) and arcpy.env.overwriteOutput:
         arcpy.management.Delete(out_route_centerlines)
     # Create route_field if it doesn't already exist, and populate it with the FC's OIDs
-    create_route_field(in_centerlines, centerline_route_field)
+    create_route_field(in_centerlines, centerline_route_field, oid_field=centerline_info.OIDFieldName)
     arcpy.lr.CreateRoutes(in_centerlines, centerline_route_field, out_route_centerlines)
     arc_print("Created centerline routes...")
 
     # Join fields from the input centerlines FC
-    # First get input centerlines FC field names and remove would-be-duplicate field
-    in_centerline_fields = [field.name for field in arcpy.ListFields(in_centerlines)]
-    in_centerline_fields.remove(centerline_route_field)
-    arcpy.management.JoinField(out_route_centerlines, centerline_route_field, 
-                               in_centerlines, centerline_route_field,
-                               in_centerline_fields)
+    # Use the input centerlines FC field names without the would-be-duplicate field
+    in_centerline_fields = [field for field in in_centerline_fields if field != centerline_route_field]
+    join_fields_with_numpy(out_route_centerlines, centerline_route_field,
+                           in_centerlines, centerline_route_field,
+                           in_centerline_fields)
 
     # At the very outset, populate a curb_feature_route_field to preserve
     # the original OIDs through the workflow (this modifies the input FC...)
-    create_route_field(in_curb_features, curb_feature_route_field)
+    create_route_field(in_curb_features, curb_feature_route_field, oid_field=curb_feature_info.OIDFieldName)
 
-    # If the curbside FC has a 'primary' field, copy only primary features to in_mem FC
+    # If the curbside FC has a 'primary' field, use only primary features
+    # The curb features are only read until their centerlines are known, so they are used through a layer
+    # over the input FC and copied to memory just once, when the centerline and m_ fields are joined to them
     if field_exist(in_curb_features, 'primary'):
-        arcpy.analysis.Select(in_curb_features, mem_curb_features, 'primary = 1')
-        arc_print('Copied primary curbside features to memory...')
-    else: # Otherwise copy them all
-        arcpy.management.CopyFeatures(in_curb_features, mem_curb_features)
-        arc_print('Copied all curbside features to memory...')
+        arcpy.management.MakeFeatureLayer(in_curb_features, curb_features_layer, 'primary = 1')
+        arc_print('Selected primary curbside features...')
+    else: # Otherwise use them all
+        arcpy.management.MakeFeatureLayer(in_curb_features, curb_features_layer)
+        arc_print('Selected all curbside features...')
 
-    # Derive length_unit from bandwidth
+    # Derive the length unit from bandwidth
     # This is necessary because we screen candidate associations by d_over_l,
     # the ratio of Distance_delta to curb_feature_length, so these two lengths
     # must be in the same linear units. Distance_delta is always in the units
-    # specified in bandwidth, and we can specify the Length_Unit when calling
-    # arcpy.management.AddGeometryAttributes(), but the unit names are different
-    # in these two contexts.
-    if bandwidth.split(' ')[1] == 'Feet':
-        length_unit = 'FEET_US' # arcpy.Describe().spatialReference.linearUnitName == 'Foot_US'
-    elif bandwidth.split(' ')[1] == 'Meters':
-        length_unit = 'METERS' # arcpy.Describe().spatialReference.linearUnitName == 'Meter'
-    else:
+    # specified in bandwidth, while shape lengths are in the linear unit of the
+    # curb features' spatial reference, so they are converted to meters and divided by unit_meters.
+    try:
+        unit_meters = bandwidth_unit_meters[bandwidth.rsplit(' ', 1)[1]]
+    except (KeyError, IndexError):
         raise ValueError('Bandwidth must be in either Feet or Meters')
+
+    # Largest ratio of Distance_delta to curb feature length that angle_threshold allows
+    max_d_over_l = math.sin(math.radians(angle_threshold))
     
-    # Add LENGTH field containing curb features' length in the appropriate linear unit
-    # If there is already a field named LENGTH, this will overwrite that field!
-    arcpy.management.AddGeometryAttributes(mem_curb_features, 'LENGTH', length_unit) 
-    arc_print("Added LENGTH to curb features...")
+    # Read curb features' lengths in the appropriate linear unit into an array sorted by route ID, instead of
+    # writing a LENGTH field to the curb features only to read it back from the located events
+    curb_spatial_reference = curb_feature_info.spatialReference
+    if curb_spatial_reference.type == 'Projected':
+        curb_lengths = arcpy.da.FeatureClassToNumPyArray(curb_features_layer,
+                                                         [curb_feature_route_field, 'SHAPE@LENGTH'])
+        curb_lengths.sort(order=curb_feature_route_field)
+        length_ids = curb_lengths[curb_feature_route_field]
+        lengths = curb_lengths['SHAPE@LENGTH'] * (curb_spatial_reference.metersPerUnit / unit_meters)
+    else:
+        # Shape lengths in a geographic coordinate system (such as the WGS84 output of T1) are in degrees, so
+        # geodesic lengths in meters are measured from the geometries instead
+        route_ids, geodesic_meters = [], []
+        with arcpy.da.SearchCursor(curb_features_layer, [curb_feature_route_field, 'SHAPE@']) as cursor:
+            for route_id, shape in cursor:
+                route_ids.append(route_id)
+                geodesic_meters.append(shape.getLength('GEODESIC', 'METERS') if shape else np.nan)
+        order = np.argsort(route_ids, kind='stable')
+        length_ids = np.asarray(route_ids)[order]
+        lengths = np.asarray(geodesic_meters, dtype=float)[order] / unit_meters
+    arc_print("Read curb feature lengths...")
 
     # Create points at start and end vertices of each curb feature
-    arcpy.management.FeatureVerticesToPoints(mem_curb_features, mem_vertices, 'BOTH_ENDS')
+    # Only the route ID is needed downstream, so every other attribute is hidden on the way in;
+    # otherwise each attribute would be copied into the vertex points and again into the located events table
+    vertex_field_info = arcpy.FieldInfo()
+    for field in arcpy.ListFields(curb_features_layer):
+        needed = field.type in ('OID', 'Geometry') or field.name == curb_feature_route_field
+        vertex_field_info.addField(field.name, field.name, 'VISIBLE' if needed else 'HIDDEN', 'NONE')
+    vertex_source = arcpy.management.MakeFeatureLayer(curb_features_layer, 'curb_vertex_source',
+                                                      field_info=vertex_field_info)
+    arcpy.management.FeatureVerticesToPoints(vertex_source, mem_vertices, 'BOTH_ENDS')
+    arcpy.management.Delete(vertex_source)
     arc_print("Created start and end vertex points...")
 
     # Locate the vertex points along centerline routes
@@ -178,55 +278,93 @@ def prepare_lr_correspondence(in_centerlines, in_curb_features,
                                        centerline_route_field, bandwidth, mem_located, 
                                        centerline_route_field + ' Point m_located', 'ALL')
     arc_print("Located start and end points along centerline routes...")
+    # memory workspace feature classes are held in RAM, so each is deleted as soon as it has been consumed
+    arcpy.management.Delete(mem_vertices)
 
-    # Read the located events table in as a DataFrame
-    located = arcgis_table_to_df(mem_located)
+    # Read the located events table in as a NumPy structured array
+    # The route IDs stay plain integer columns that are sorted below, so no DataFrame (or grouping keys) is built
+    located = arcpy.da.TableToNumPyArray(mem_located, [curb_feature_route_field, centerline_route_field,
+                                                       'm_located', 'Distance'], null_value=-1)
+    arcpy.management.Delete(mem_located)
 
-    # Group by curb_feature_ID and corridor_ID and aggregate key fields
-    df = located.groupby([curb_feature_route_field, centerline_route_field]) \
-                .agg({'m_located': [min, max, 'count'], 
-                      'Distance': [min, max],
-                      'LENGTH': 'first'}).reset_index()
-    # Flatten multi-level columns
-    df.columns = ['_'.join(x) if len(x[1]) else x[0] for x in df.columns.ravel()]
-    
-    # Filter df down to the important entries
-    df = df[df['m_located_count'] > 1] # keep only centerlines on which both start and end vertices were located
+    # Sort the located events by curb_feature_ID and then corridor_ID so that every (curb feature, corridor)
+    # group occupies consecutive positions, and aggregate key fields over those segments with NumPy reductions
+    curb_ids = located[curb_feature_route_field]
+    corridor_ids = located[centerline_route_field]
+    order = np.lexsort((corridor_ids, curb_ids))
+    curb_ids, corridor_ids = curb_ids[order], corridor_ids[order]
+    m_located = located['m_located'][order]
+    distance = located['Distance'][order]
+    new_group = np.ones(len(curb_ids), dtype=bool)
+    new_group[1:] = (curb_ids[1:] != curb_ids[:-1]) | (corridor_ids[1:] != corridor_ids[:-1])
+    group_starts = np.flatnonzero(new_group)
+    m_located_count = np.diff(np.r_[group_starts, len(curb_ids)])
+    # keep only centerlines on which both start and end vertices were located
     # this has a tiny chance of retaining curb features where one vertex was located twice and the other vertex
     # was not located at all, but we can probably catch those edge cases in other ways
-    df = df[df['m_located_min'] != df['m_located_max']] # keep only centerlines where start and end vertices had different m_values
+    # Singleton groups can never pass, so their events are dropped before the reductions rather than after them
+    paired = m_located_count > 1
+    paired_events = np.repeat(paired, m_located_count)
+    curb_ids, corridor_ids = curb_ids[paired_events], corridor_ids[paired_events]
+    m_located, distance = m_located[paired_events], distance[paired_events]
+    m_located_count = m_located_count[paired]
+    group_starts = np.cumsum(m_located_count) - m_located_count
+    m_located_min = np.minimum.reduceat(m_located, group_starts)
+    m_located_max = np.maximum.reduceat(m_located, group_starts)
+    distance_min = np.minimum.reduceat(distance, group_starts)
+    distance_max = np.maximum.reduceat(distance, group_starts)
+    curb_ids, corridor_ids = curb_ids[group_starts], corridor_ids[group_starts]
+
+    # Filter groups down to the important entries
+    # keep only centerlines where start and end vertices had different m_values
+    keep = np.flatnonzero(m_located_min != m_located_max)
 
     # Calculate some key metrics we will use to identify the correct centerline to associate each curb feature with
-    df['Distance_delta'] = (df['Distance_max'] - df['Distance_min']).abs() # we want the absolute difference between the two distances
-    df['Distance_mean'] = (df['Distance_max'].abs() + df['Distance_min'].abs()) / 2 # we want the mean of the absolute distances to the route
-    df['d_over_l'] = df['Distance_delta'] / df['LENGTH_first']
+    # (only for the groups that are still candidates)
+    distance_min, distance_max = distance_min[keep], distance_max[keep]
+    distance_delta = np.abs(distance_max - distance_min) # we want the absolute difference between the two distances
+    # we want the closest route by the mean of the absolute distances; their sum ranks routes the same way
+    distance_sum = np.abs(distance_max) + np.abs(distance_min)
+    # each candidate's curb feature length is looked up by route ID in the sorted lengths array
+    d_over_l = distance_delta / lengths[np.searchsorted(length_ids, curb_ids[keep])]
 
-    # Filter out "bad" rows based on d_over_l and then use groupby to identify the closest nearly parallel centerline
-    df = df[df['d_over_l'] < math.sin(math.radians(angle_threshold))]
-    temp = pd.DataFrame(df.groupby(curb_feature_route_field)['Distance_mean'].idxmin())
-    my_df = temp.join(df[[centerline_route_field, 'm_located_min', 'm_located_max']], on = 'Distance_mean')
-    my_df = my_df.drop(columns = 'Distance_mean')
-    my_df = my_df.reset_index() # bring curb_feature_route_field back into the columns
-    my_df.columns = [curb_feature_route_field, centerline_route_field, 'm_from', 'm_to']
+    # Filter out "bad" groups based on d_over_l and then identify the closest nearly parallel centerline.
+    # Candidates are still ordered by curb_feature_ID, so the minimum distance_sum of each curb feature is a
+    # segment reduction, and the closest centerline is the first candidate matching it (ties keep the first
+    # corridor_ID like idxmin would)
+    parallel = d_over_l < max_d_over_l
+    keep, distance_sum = keep[parallel], distance_sum[parallel]
+    candidate_curbs = curb_ids[keep]
+    new_curb = np.ones(len(keep), dtype=bool)
+    new_curb[1:] = candidate_curbs[1:] != candidate_curbs[:-1]
+    curb_starts = np.flatnonzero(new_curb)
+    curb_min_distance = np.minimum.reduceat(distance_sum, curb_starts)
+    minima = np.flatnonzero(distance_sum == np.repeat(curb_min_distance, np.diff(np.r_[curb_starts, len(keep)])))
+    first_minimum = np.ones(len(minima), dtype=bool)
+    first_minimum[1:] = candidate_curbs[minima][1:] != candidate_curbs[minima][:-1]
+    closest = keep[minima[first_minimum]]
 
-    # Export centerline and m_fields to ArcGIS table in memory
-    # drawing on https://my.usgs.gov/confluence/display/cdi/pandas.DataFrame+to+ArcGIS+Table
-    x = np.array(np.rec.fromrecords(my_df.values))
-    names = my_df.columns.tolist()
-    x.dtype.names = tuple(names)
-    if arcpy.Exists(mem_table):
-        arcpy.management.Delete(mem_table)
-    arcpy.da.NumPyArrayToTable(x, mem_table)
-    arc_print("Completed pandas processing of located events table...")
+    # Gather the centerline and m_fields of each closest centerline straight into a NumPy structured array
+    # with its final field names, instead of building a DataFrame only to convert it
+    x = np.empty(len(closest), dtype=[(curb_feature_route_field, curb_ids.dtype),
+                                      (centerline_route_field, corridor_ids.dtype),
+                                      ('m_from', m_located_min.dtype), ('m_to', m_located_max.dtype)])
+    x[curb_feature_route_field] = curb_ids[closest]
+    x[centerline_route_field] = corridor_ids[closest]
+    x['m_from'] = m_located_min[closest]
+    x['m_to'] = m_located_max[closest]
+    arc_print("Completed processing of located events table...")
     
-    # Join centerline and m_ fields to mem_curb_features
-    names.remove(curb_feature_route_field)
-    fields_to_join = ';'.join(names)
-    arcpy.management.JoinField(mem_curb_features, curb_feature_route_field, 
-                            mem_table, curb_feature_route_field, fields_to_join)
+    # Copy the curb features to memory and join centerline and m_ fields to them in place,
+    # without writing an intermediate table
+    arcpy.management.CopyFeatures(curb_features_layer, mem_curb_features)
+    arcpy.da.ExtendTable(mem_curb_features, curb_feature_route_field, x, curb_feature_route_field,
+                         append_only=False)
+    arc_print('Copied curbside features to memory...')
 
     # Select only those curb features with m-values (i.e. with an associated centerline)
-    arcpy.analysis.Select(mem_curb_features, mem_curb_features_matched, 'm_from IS NOT NULL')
+    # through a layer, rather than copying them a second time
+    arcpy.management.MakeFeatureLayer(mem_curb_features, mem_curb_features_matched, 'm_from IS NOT NULL')
 
     # Delete output FC if necessary
     if arcpy.Exists(out_route_curb_features) and arcpy.env.overwriteOutput:
@@ -242,9 +380,10 @@ def prepare_lr_correspondence(in_centerlines, in_curb_features,
     fields_to_exclude = [curb_feature_route_field, 'LENGTH', 'Shape__Length', 'Shape_Length']
     fields_to_join = [field.name for field in arcpy.ListFields(mem_curb_features_matched) \
                       if field.name not in fields_to_exclude]
-    arcpy.management.JoinField(out_route_curb_features, curb_feature_route_field, 
-                               mem_curb_features_matched, curb_feature_route_field,
-                               fields_to_join)
+    join_fields_with_numpy(out_route_curb_features, curb_feature_route_field,
+                           mem_curb_features_matched, curb_feature_route_field,
+                           fields_to_join)
+    arcpy.management.Delete([mem_curb_features_matched, mem_curb_features, curb_features_layer])
     arc_print("Script complete...")
 
 # This test allows the script to be used from the operating system 
@@ -22,8 +22,12 @@
 # --------------------------------
 # Import Modules
 import pandas as pd
-import arcpy, os
+import arcpy, os, re
 import numpy as np
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None # fall back to reading tables with arcpy.da.SearchCursor
 # import curbsidelib as csl
 
 # functions from former curbsidelib
@@ -49,12 +53,92 @@ def arcgis_table_to_df(in_fc, input_fields=None, query=""):
     if input_fields:
         final_fields = [OIDFieldName] + input_fields
     else:
-        final_fields = [field.name for field in arcpy.ListFields(in_fc)]
-    data = [row for row in arcpy.da.SearchCursor(in_fc, final_fields, where_clause=query)]
-    fc_dataframe = pd.DataFrame(data, columns=final_fields)
+        final_fields = [field.name for field in arcpy.ListFields(in_fc)
+                        if field.type not in ("Geometry", "Blob", "Raster")]
+    # a cursor rather than TableToNumPyArray, since NumPy arrays cannot hold nulls in integer and text fields
+    with arcpy.da.SearchCursor(in_fc, final_fields, where_clause=query) as cursor:
+        fc_dataframe = pd.DataFrame.from_records(cursor, columns=final_fields)
     fc_dataframe = fc_dataframe.set_index(OIDFieldName, drop=True)
     return fc_dataframe
 
+def ogr_data_source(catalog_path):
+    """Returns the (data source, layer name) pair that GDAL/OGR can open for a feature class or table in a file
+    geodatabase or a shapefile, or None for any other workspace (enterprise geodatabases, memory, etc.).
+    :param - catalog_path - catalog path of the feature class or table
+    :returns - tuple or None"""
+    if catalog_path.lower().endswith(".shp"):
+        return catalog_path, None
+    workspace = os.path.dirname(catalog_path)
+    while workspace and os.path.dirname(workspace) != workspace:
+        if workspace.lower().endswith(".gdb"):
+            return workspace, os.path.basename(catalog_path)
+        workspace = os.path.dirname(workspace)
+    return None
+
+def arcgis_table_to_df_fast(in_fc, input_fields=None, query=""):
+    """Function will convert an arcgis table into a pandas dataframe with an object ID index, and the selected
+    input fields, reading every field as a column with pyogrio when GDAL can open the workspace. Otherwise (or if
+    pyogrio is not installed) it falls back to arcgis_table_to_df. Layers and table views are always read with
+    arcgis_table_to_df, since pyogrio reads the underlying data and would ignore their selections and definition
+    queries, and so are tables with nullable integer fields, which pyogrio reads as floats.
+    :param - in_fc - input feature class or table to convert
+    :param - input_fields - fields to retrieve
+    :param - query - sql query to grab appropriate values
+    :returns - pandas.DataFrame"""
+    if pyogrio is None:
+        return arcgis_table_to_df(in_fc, input_fields, query)
+    fc_info = arcpy.Describe(in_fc)
+    if fc_info.dataType in ("FeatureLayer", "TableView", "Layer"):
+        return arcgis_table_to_df(in_fc, input_fields, query)
+    if any(field.type in ("Integer", "SmallInteger") and field.isNullable for field in fc_info.fields
+           if not input_fields or field.name in input_fields):
+        return arcgis_table_to_df(in_fc, input_fields, query)
+    source = ogr_data_source(fc_info.catalogPath)
+    if source is None:
+        return arcgis_table_to_df(in_fc, input_fields, query)
+    data_source, layer = source
+    try:
+        fc_dataframe = pyogrio.read_dataframe(data_source, layer=layer, columns=input_fields or None,
+                                              where=query or None, read_geometry=False, fid_as_index=True)
+    except Exception:
+        arc_print("Could not read {0} with pyogrio, reading it with a search cursor...".format(in_fc))
+        return arcgis_table_to_df(in_fc, input_fields, query)
+    fc_dataframe.index.name = fc_info.OIDFieldName
+    return fc_dataframe
+
+def times_of_day_to_datetime(times):
+    """Parses a series of CurbLR times of day (e.g. "08:00") to datetimes, trying the explicit HH:MM and HH:MM:SS
+    formats before falling back to pandas' slower format inference.
+    :param - times - pandas series of time of day strings
+    :returns - pandas series of datetimes"""
+    for time_format in ("%H:%M", "%H:%M:%S"):
+        try:
+            return pd.to_datetime(times, format=time_format)
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(times)
+
+def remove_centermost_lanes(lanes, removal_count, lane_check):
+    """This worker function will remove the left most lane (towards center) of every row of a 2D array of lane
+    widths in 1,2,3,4 order, removal_count times, modifying the array in place. Each removal clears the lane before
+    every empty lane for all rows at once with boolean masks.
+    :param - lanes - 2D float array with one row per street and one column per lane
+    :param - removal_count - number of lanes to remove from each row
+    :param - lane_check - index of the lane that is never cleared (0 locks the last lane left for a street)
+    :returns - lanes"""
+    for removal in range(removal_count):
+        empty_lanes = lanes <= 0
+        # an empty first lane clears the lane "before" it, which wraps around to the last lane
+        if lane_check != -1:
+            wrapped = empty_lanes[:, 0]
+            lanes[wrapped, -1] = 0
+            empty_lanes[wrapped, -1] = True
+        cleared_lanes = empty_lanes[:, 1:]
+        if 0 <= lane_check < cleared_lanes.shape[1]:
+            cleared_lanes[:, lane_check] = False
+        lanes[:, :-1][cleared_lanes] = 0
+    return lanes
+
 class shared_row_data_evaluator(object):
     """
     This class manages methods and assumptions related to the shared-row specification for right of way reporting.
@@ -106,6 +190,9 @@ class shared_row_data_evaluator(object):
                                self.center_width_field + self.RTL_List + self.right_spec_slices \
                                + self.right_sidewalk_slices
         self.row_slices = [i for i in self.spec_row_fields if i in self.sr_df.columns]
+        # positions of the sidewalk slices among the row slices, used by update_row to sum them from one array
+        self.left_sidewalk_positions = [self.row_slices.index(i) for i in self.left_sidewalk_slices]
+        self.right_sidewalk_positions = [self.row_slices.index(i) for i in self.right_sidewalk_slices]
         self.sr_df["Total_ROW_Width"] = self.sr_df[self.row_slices].sum(axis=1)
         self.sr_df["Base_Total_ROW_Width"] = self.sr_df["Total_ROW_Width"]
         self.sr_df["Unused_ROW_Width"] = 0
@@ -113,6 +200,22 @@ class shared_row_data_evaluator(object):
         self.sr_df["Right_Sidewalk_Width"] = self.sr_df[self.right_sidewalk_slices].sum(axis=1)
         self.sr_df["Curb_To_Curb_Width"] = self.sr_df["Total_ROW_Width"] - (self.sr_df["Left_Sidewalk_Width"] +
                                                                             self.sr_df["Right_Sidewalk_Width"])
+        # Maximum widths used by right_size_row: 11 feet for curbside through lanes, 10 feet for other through lanes,
+        # and 8 feet for parking lanes
+        feet_to_meters = 0.3048 # fixed conversion from feet to meters!
+        right_size_maxes = {lane: (11 if "1" in lane else 10) * feet_to_meters for lane in self.RTL_List + self.LTL_List}
+        right_size_maxes.update({lane: 8 * feet_to_meters for lane in self.row_slices
+                                 if "Parking" in lane and "Meta" not in lane})
+        self.right_size_lanes = list(right_size_maxes)
+        self.right_size_maxes = np.array(list(right_size_maxes.values()))
+        # Integer positions of the lane and row slice columns, so the methods below read them by position instead of
+        # resolving the label lists on every call. Scenario dataframes are copies of sr_df and only ever gain
+        # columns at the end, so these positions hold for every scenario. Columns are still written back by label,
+        # which lets pandas replace them with the dtype of the new values.
+        self.row_slice_positions = self.sr_df.columns.get_indexer(self.row_slices)
+        self.RTL_positions = self.sr_df.columns.get_indexer(self.RTL_List)
+        self.LTL_positions = self.sr_df.columns.get_indexer(self.LTL_List)
+        self.right_size_positions = self.sr_df.columns.get_indexer(self.right_size_lanes)
 
     def __str__(self):
         return "shared_row_data_evaluator"
@@ -123,6 +226,14 @@ class shared_row_data_evaluator(object):
         passed."""
         return self.scenario_dfs.get(scenario, self.sr_df)
 
+    def get_scenario_df(self, scenario_key):
+        """Returns the dataframe of a scenario, copying the main dataframe only when the scenario does not exist yet
+        (dict.setdefault would copy it on every call, even for existing scenarios).
+        @:param - scenario_key - the new or existing key for a scenario to modify or create from the base"""
+        if scenario_key not in self.scenario_dfs:
+            self.scenario_dfs[scenario_key] = self.sr_df.copy()
+        return self.scenario_dfs[scenario_key]
+
     def clear_sceanarios(self):
         """Calling this function will clear all scenario dictionaries from the class."""
         self.scenario_dfs = {}
@@ -141,23 +252,11 @@ class shared_row_data_evaluator(object):
         """Create a scenario or modify an existing scenario by setting all lane widths to a max of 10 feet for
         through lanes (11 feet for the curbside lane), and parking lanes to a max of 8 feet.
         :param scenario_key - name of scenario as a string or other hashable object"""
-        scenario_df = self.scenario_dfs.setdefault(scenario_key, self.sr_df.copy())
-
-        curb_side_lanes = [i for i in self.RTL_List + self.LTL_List if "1" in i]
-        other_thru_lanes = [i for i in self.RTL_List + self.LTL_List if "1" not in i]
-        parking_lanes = [i for i in self.row_slices if "Parking" in i and "Meta" not in i]
-        for oth_thru_lane in curb_side_lanes:
-            curb_side_lane_max = 11 * 0.3048 # fixed conversion from feet to meters!
-            scenario_df[oth_thru_lane] = np.where(scenario_df[oth_thru_lane] > curb_side_lane_max, curb_side_lane_max,
-                                                  scenario_df[oth_thru_lane])
-        for oth_thru_lane in other_thru_lanes:
-            lane_max = 10 * 0.3048 # fixed conversion from feet to meters!
-            scenario_df[oth_thru_lane] = np.where(scenario_df[oth_thru_lane] > lane_max, lane_max,
-                                                  scenario_df[oth_thru_lane])
-        for parking_lane in parking_lanes:
-            park_max = 8 * 0.3048 # fixed conversion from feet to meters!
-            scenario_df[parking_lane] = np.where(scenario_df[parking_lane] > park_max, park_max,
-                                                 scenario_df[parking_lane])
+        scenario_df = self.get_scenario_df(scenario_key)
+        # every lane is capped at its maximum width in a single pass over all lane columns
+        if self.right_size_lanes:
+            lanes = scenario_df.iloc[:, self.right_size_positions].to_numpy()
+            scenario_df[self.right_size_lanes] = np.minimum(lanes, self.right_size_maxes)
         self.update_row(scenario_key)
         return scenario_df
 
@@ -171,32 +270,24 @@ class shared_row_data_evaluator(object):
         @add_twltl = indicates whether to add a two way left turn lane if no existing center allocation of significance
         exists.  """
         #TODO implement twltl
-        scenario_df = self.scenario_dfs.setdefault(scenario_key, self.sr_df.copy())
+        scenario_df = self.get_scenario_df(scenario_key)
         right_temp_tracker = "Right_Most"
         left_temp_tracker = "Left_Most"
         scenario_df[right_temp_tracker] = 0
         scenario_df[left_temp_tracker] = 0
-        def remove_centermost_lane(row, lock_last_lane = lock_last_lane):
-            """This worker function will remove the left most lane (towards center) assuming a list of lane
-             values are passed in 1,2,3,4 order. """
-            if lock_last_lane:
-                lane_check = 0
-            else:
-                lane_check = -1
-            for idx, value in enumerate(row):
-                if value <= 0 and (idx-1) != lane_check:
-                    row[idx-1] = 0
-                elif idx == len(row)+1:
-                    row[idx] = 0
-                else:
-                    pass
-            return row
+        if lock_last_lane:
+            lane_check = 0
+        else:
+            lane_check = -1
         right_lanes_to_remove = int(round(lane_removal_count/2.0,0))
         left_lanes_to_remove = int(lane_removal_count/2.0)
-        for i in range(right_lanes_to_remove):
-            scenario_df[self.RTL_List] = scenario_df[self.RTL_List].apply(remove_centermost_lane,axis=1)
-        for i in range(left_lanes_to_remove):
-            scenario_df[self.LTL_List] = scenario_df[self.LTL_List].apply(remove_centermost_lane,axis=1)
+        # all removals are applied to the lane widths as one array, rather than row by row through DataFrame.apply
+        if self.RTL_List and right_lanes_to_remove:
+            lanes = scenario_df.iloc[:, self.RTL_positions].to_numpy(dtype=float, copy=True)
+            scenario_df[self.RTL_List] = remove_centermost_lanes(lanes, right_lanes_to_remove, lane_check)
+        if self.LTL_List and left_lanes_to_remove:
+            lanes = scenario_df.iloc[:, self.LTL_positions].to_numpy(dtype=float, copy=True)
+            scenario_df[self.LTL_List] = remove_centermost_lanes(lanes, left_lanes_to_remove, lane_check)
         self.update_row(scenario_key)
         return scenario_df
 
@@ -205,7 +296,7 @@ class shared_row_data_evaluator(object):
         @:param - scenario_key - the new or existing key for a scenario to modify or create from the base
         @:param - right_lane_removed - is the right parking lane removed for the scenario
         @:param - left_lane_removed - is the left parking lane removed for the scenario"""
-        scenario_df = self.scenario_dfs.setdefault(scenario_key, self.sr_df.copy())
+        scenario_df = self.get_scenario_df(scenario_key)
         parking_lanes = [i for i in self.row_slices if "Parking_Lane" in i and "Meta" not in i]
         right_parking_lane = [i for i in parking_lanes if "Right" in i]
         left_parking_lane = [i for i in parking_lanes if "Left" in i]
@@ -225,7 +316,6 @@ class shared_row_data_evaluator(object):
         @:param - right_lane_name - name of output lane field
         @:param - left_lane_name - name of output lane field
         @:param - total_lane_name - name of output lane field"""
-        right_lanes_df, left_lanes_df = None, None
         if scenario in self.scenario_dfs:
             main_df = self.scenario_dfs.get(scenario)
             added_columns = self.added_columns.get(scenario, [])
@@ -235,19 +325,13 @@ class shared_row_data_evaluator(object):
             added_columns = self.added_columns.get("BASELINE_ROW", [])
             added_columns.extend([right_lane_name, left_lane_name, total_lanes_name])
         print("Identifying lanes...")
-        for l_lane, r_lane in zip(self.LTL_List, self.RTL_List):
-            right_binary_column = pd.Series(np.where(main_df[r_lane] > 0, 1, 0), name=r_lane)
-            left_binary_column = pd.Series(np.where(main_df[l_lane] > 0, 1, 0), name=l_lane)
-            if right_lanes_df is None or left_lanes_df is None:
-                right_lanes_df = right_binary_column
-                left_lanes_df = left_binary_column
-            else:
-                right_lanes_df = pd.concat([right_lanes_df, right_binary_column], axis=1)
-                left_lanes_df = pd.concat([left_lanes_df, left_binary_column], axis=1)
-        main_df[right_lane_name] = right_lanes_df.sum(axis=1).fillna(0)
-        main_df[left_lane_name] = left_lanes_df.sum(axis=1).fillna(0)
+        # lanes are counted over matching pairs of left and right lanes, as widths greater than 0
+        lane_pairs = min(len(self.LTL_List), len(self.RTL_List))
+        right_lanes = main_df.iloc[:, self.RTL_positions[:lane_pairs]].to_numpy()
+        left_lanes = main_df.iloc[:, self.LTL_positions[:lane_pairs]].to_numpy()
+        main_df[right_lane_name] = (right_lanes > 0).sum(axis=1)
+        main_df[left_lane_name] = (left_lanes > 0).sum(axis=1)
         main_df[total_lanes_name] = main_df[left_lane_name] + main_df[right_lane_name]
-        del right_lanes_df, left_lanes_df
 
     def update_row(self, scenario):
         """Update the ROW Calculations for a chosen scenario. Used anytime an editor function is called.
@@ -257,10 +341,12 @@ class shared_row_data_evaluator(object):
             self.added_columns.setdefault(scenario, self.added_columns.get("BASELINE_ROW"))
         else:
             scen_df = self.sr_df
-        scen_df["Total_ROW_Width"] = scen_df[self.row_slices].sum(axis=1)
+        # the row slices are read into one array once, and every width below is summed from it
+        row_widths = scen_df.iloc[:, self.row_slice_positions].to_numpy(dtype=float, na_value=0.0)
+        scen_df["Total_ROW_Width"] = row_widths.sum(axis=1)
         scen_df["Unused_ROW_Width"] = scen_df["Base_Total_ROW_Width"] - scen_df["Total_ROW_Width"]
-        scen_df["Left_Sidewalk_Width"] = scen_df[self.left_sidewalk_slices].sum(axis=1)
-        scen_df["Right_Sidewalk_Width"] = scen_df[self.right_sidewalk_slices].sum(axis=1)
+        scen_df["Left_Sidewalk_Width"] = row_widths[:, self.left_sidewalk_positions].sum(axis=1)
+        scen_df["Right_Sidewalk_Width"] = row_widths[:, self.right_sidewalk_positions].sum(axis=1)
         scen_df["Curb_To_Curb_Width"] = (scen_df["Total_ROW_Width"] + scen_df["Unused_ROW_Width"]) - \
                                         (scen_df["Left_Sidewalk_Width"] + scen_df["Right_Sidewalk_Width"])
 
@@ -269,25 +355,62 @@ class shared_row_data_evaluator(object):
         scenario keys will be cast as strings and have spaces replaced with underscores, and made into a prefix for
         the selected columns. Those columns will be concatenated column wise to the main df and returned.
         :param - columns - fields to extract from each scenario df and to add prefixes to the main df for"""
-        temp_dataframe = None
-        for scenario in self.scenario_dfs:
+        extracted_dataframes = []
+        for scenario, scenario_df in self.scenario_dfs.items():
             try:
-                scenario_df = self.scenario_dfs.get(scenario)
                 new_columns = ["{0}_{1}".format(str(scenario).replace(" ", "_"), i) for i in columns]
-                extracted_columns = scenario_df[columns]
+                extracted_columns = scenario_df[columns].copy()
                 extracted_columns.columns = new_columns
-                if extracted_columns is not None and temp_dataframe is None:
-                    temp_dataframe = extracted_columns
-                    temp_dataframe.columns = new_columns
-                else:
-                    temp_dataframe = pd.concat([temp_dataframe, extracted_columns], axis=1)
+                extracted_dataframes.append(extracted_columns)
             except:
                 print("Could not process columns for scenario {0}.".format(scenario))
-        return temp_dataframe
+        # the scenarios' columns are concatenated once, instead of once per scenario
+        if not extracted_dataframes:
+            return None
+        return pd.concat(extracted_dataframes, axis=1)
+
+def df_to_structured_array(df):
+    """Converts a dataframe to a NumPy structured array that arcpy.da can write, with one field per column.
+    :param - df - dataframe to convert
+    :returns - numpy structured array"""
+    arrays = []
+    for column_name, column in df.items():
+        if column.dtype == bool:
+            arrays.append(column.to_numpy(dtype="i4"))
+        elif column.dtype.kind in "iu" and column.hasnans:
+            arrays.append(column.to_numpy(dtype=float, na_value=np.nan)) # integer gaps are written as NaN
+        elif column.dtype.kind in "iufmM":
+            arrays.append(column.to_numpy())
+        else:
+            # unicode fields cannot hold nulls; restore_text_nulls writes them back after the join
+            arrays.append(column.fillna("").astype(str).to_numpy(dtype=str))
+    return np.rec.fromarrays(arrays, names=[str(column_name) for column_name in df.columns]).view(np.ndarray)
+
+def restore_text_nulls(df, target_feature_class, df_join_field, feature_class_join_field):
+    """Sets the text fields joined from a dataframe back to null where df_to_structured_array wrote empty strings.
+    @:param - df - dataframe that was joined, with its columns named like the joined fields
+    @:param - target_feature_class - the feature class the data was joined to
+    @:param - df_join_field - field in dataframe the join was based on
+    @:param - feature_class_join_field - feature class field the join was based on"""
+    text_columns = [name for name, column in df.items() if name != df_join_field and column.dtype != bool
+                    and column.dtype.kind not in "iufmM" and column.hasnans]
+    if not text_columns:
+        return
+    null_flags = df[text_columns].isna()
+    null_rows = null_flags.any(axis=1).to_numpy()
+    null_dict = dict(zip(df[df_join_field].to_numpy()[null_rows].tolist(),
+                         null_flags.to_numpy()[null_rows].tolist()))
+    with arcpy.da.UpdateCursor(target_feature_class, [feature_class_join_field] + text_columns) as cursor:
+        for row in cursor:
+            flags = null_dict.get(row[0])
+            if flags:
+                cursor.updateRow([row[0]] + [None if is_null else value for value, is_null in zip(row[1:], flags)])
 
 def join_df_columns_to_feature_class(df, target_feature_class, df_join_field,
                                      feature_class_join_field="@OID", join_columns = []):
-    """Will join chosen columns  to a feature class from a dataframe using temporary csvs and in_memory tables.
+    """Will join chosen columns  to a feature class from a dataframe using a NumPy structured array and
+    arcpy.da.ExtendTable, without writing the dataframe to disk. Null text values are restored afterwards by
+    restore_text_nulls.
     @:param - df - dataframe with data to join
     @:param - target_feature_class - the feature class to join data to
     @:param - df_join_field - field in dataframe to base join
@@ -296,19 +419,16 @@ def join_df_columns_to_feature_class(df, target_feature_class, df_join_field,
     @:param - join_columns - columns to join to the feature class"""
     if feature_class_join_field == "@OID":
         feature_class_join_field = arcpy.Describe(target_feature_class).OIDFieldName
-    temp_folder = arcpy.env.scratchFolder
-    temp_csv = os.path.join(temp_folder,"join_csv.csv")
-    df.to_csv(temp_csv)
-    temp_table = "temp_table"
-    arcpy.TableToTable_conversion(temp_csv,"in_memory",temp_table)
-    temp_table_path = os.path.join("in_memory", temp_table)
-    arcpy.JoinField_management(target_feature_class,feature_class_join_field,temp_table_path,df_join_field,join_columns)
+    join_df = df[[df_join_field] + [i for i in join_columns if i != df_join_field]].copy()
+    # the join keys must have the same type as the feature class field, e.g. integer IDs that were read as floats
+    join_field_type = arcpy.ListFields(target_feature_class, feature_class_join_field)[0].type
+    if join_field_type in ("OID", "Integer", "SmallInteger"):
+        join_df[df_join_field] = join_df[df_join_field].astype("i4")
+    join_array = df_to_structured_array(join_df)
+    arcpy.da.ExtendTable(target_feature_class, feature_class_join_field, join_array, df_join_field,
+                         append_only=False)
+    restore_text_nulls(join_df, target_feature_class, df_join_field, feature_class_join_field)
     print("Dataframe Fields Joined to Feature Class.")
-    try:
-        os.remove(temp_csv)
-        os.removedirs(temp_folder)
-    except:
-        print("Could not complete a full clean up of the scratchFolder.")
 
 
 def conduct_row_and_curbside_statistic_analysis(centerline_features,corridor_id, curbside_features,
@@ -339,12 +459,33 @@ def conduct_row_and_curbside_statistic_analysis(centerline_features,corridor_id,
     oid_field_for_df = arcpy.Describe(output_summary_feature_class).OIDFieldName
     arc_print("Output Feature Class Copied...")
     feet_of_curb = "Linear_Feet"
-    arcpy.AddField_management(curbside_features, feet_of_curb, "DOUBLE")
-    arcpy.CalculateField_management(curbside_features, feet_of_curb, expression="!shape.length@FEET!",
-                                    expression_type="PYTHON")
     arc_print("Converting Tables to Dataframes...")
-    row_df = arcgis_table_to_df(output_summary_feature_class)
-    curb_df = arcgis_table_to_df(curbside_features)
+    # Only the fields used below are read: the shared-row slices of the centerlines (all named Left_*, Right_* or
+    # Center_*), and the regulation fields of the curb features that exist
+    row_fields = [field.name for field in arcpy.ListFields(output_summary_feature_class)
+                  if field.name.startswith(("Left_", "Right_", "Center_"))]
+    curb_field_names = {field.name for field in arcpy.ListFields(curbside_features)}
+    curb_fields = [i for i in [corridor_id, "primary", "daysOfWeek", "timesOfDay_from", "timesOfDay_to",
+                               "timesOfDay_from_dt", "timesOfDay_to_dt", "activity", "priorityCategory", "maxStay",
+                               "payment"] if i in curb_field_names]
+    row_df = arcgis_table_to_df_fast(output_summary_feature_class, row_fields)
+    curb_df = arcgis_table_to_df_fast(curbside_features, curb_fields)
+    # Curb lengths are read from the geometries in the linear unit of their spatial reference and converted to feet
+    # with NumPy, instead of adding and calculating a Linear_Feet field on the input curb features
+    curbside_info = arcpy.Describe(curbside_features)
+    if curbside_info.spatialReference.type == "Projected":
+        curb_lengths = arcpy.da.FeatureClassToNumPyArray(curbside_features,
+                                                         [curbside_info.OIDFieldName, "SHAPE@LENGTH"])
+        feet_per_unit = curbside_info.spatialReference.metersPerUnit / 0.3048
+        curb_feet = pd.Series(curb_lengths["SHAPE@LENGTH"] * feet_per_unit,
+                              index=curb_lengths[curbside_info.OIDFieldName])
+    else:
+        # Shape lengths in a geographic coordinate system (such as the WGS84 output of T1) are in degrees, so
+        # geodesic lengths in feet are measured from the geometries instead
+        with arcpy.da.SearchCursor(curbside_features, ["OID@", "SHAPE@"]) as cursor:
+            curb_feet = pd.Series({oid: shape.getLength("GEODESIC", "FEET") if shape else np.nan
+                                   for oid, shape in cursor}, dtype=float)
+    curb_df[feet_of_curb] = curb_feet.reindex(curb_df.index)
     # ## ROW Statistics & Scenarios
     # This section is dedicated to calling a ROW Manager class and determining how much ROW could be made available
     # under the assumptions related to a road diet, removal of parking lanes, and the right sizing of through
@@ -376,76 +517,70 @@ def conduct_row_and_curbside_statistic_analysis(centerline_features,corridor_id,
     # chosen corridor ID.
     # try: # taking out try/except statements for debugging
     arc_print("Developing curbside regulation summaries by corridor ID...")
-    unique_corridors = curb_df[corridor_id].unique()
     new_field_names = [corridor_id, 'Curb_Alloc_1_Activity', 'Curb_Alloc_1_Reason', 'Curb_Alloc_1_Max_Stay',
                         'Curb_Alloc_1_Paid',
                         'Curb_Alloc_1_Days_Of_Week', 'Curb_Alloc_1_Days_Active', 'Curb_Alloc_1_Begin_Time_Period',
                         'Curb_Alloc_1_End_Time_Period', 'Curb_Alloc_1_Hours_Span', "Curb_Alloc_1_Weekly_Hours",
                         'Curb_Alloc_1_Linear_Feet', 'Curb_Alloc_1_Linear_Feet_Hours']
-    final_corridor_df = None
-    counter = 0
-    arc_print("Processing and combining corridor summaries...", True)
-    for corridor in unique_corridors:
-        counter += 1
-        if counter % 500 == 0:
-            arc_print("{0} corridors processed...".format(counter))
-        corridor_df = curb_df[curb_df[corridor_id] == corridor]
-        # if the curb data have been duplicated for multiple days by T1, filter down to primary features only
-        # manually collected curb datasets will not have a 'primary' column and thus we can skip this step
-        if 'primary' in corridor_df.columns:
-            corridor_df = corridor_df[corridor_df["primary"] == 1].copy()
+    # The filters and derived fields below are computed once over every corridor's curb features, and then
+    # summarized with a single groupby keyed by corridor ID (curb features without a corridor ID are not summarized)
+    # The corridor, primary and days of week filters are combined into one set of row positions, so the curb
+    # features are copied only once
+    candidates = curb_df[corridor_id].notna().to_numpy(copy=True)
+    # if the curb data have been duplicated for multiple days by T1, filter down to primary features only
+    # manually collected curb datasets will not have a 'primary' column and thus we can skip this step
+    if 'primary' in curb_df.columns:
+        candidates &= (curb_df["primary"] == 1).to_numpy()
+    candidate_positions = np.flatnonzero(candidates)
 
-        # construct a regex pattern for use with Series.str.count() to count
-        # how many of the requested days of week each regulation is active on
-        days_analyzed_query = "|".join(day_dict.get(i) for i in days_of_week_analyzed)
-        corridor_df["Days_Active"] = (corridor_df["daysOfWeek"].str.count(days_analyzed_query))
-        corridor_df = corridor_df[corridor_df["Days_Active"]>0].copy()
-        
-        # manually collected curb datasets will not have the _dt columns so we must create them here
-        if 'timesOfDay_from_dt' not in corridor_df.columns:
-            corridor_df['timesOfDay_from_dt'] = pd.to_datetime(corridor_df['timesOfDay_from'])
-            corridor_df['timesOfDay_to_dt'] = pd.to_datetime(corridor_df['timesOfDay_to'])
-        corridor_df["Hours_Span"] = (corridor_df["timesOfDay_to_dt"] - corridor_df["timesOfDay_from_dt"]).dt.total_seconds() / 3600
-        corridor_df["Weekly_Hours"] = corridor_df["Hours_Span"] * corridor_df["Days_Active"]
-        corridor_df["Linear_Feet_Hours"] = corridor_df["Weekly_Hours"] * corridor_df["Linear_Feet"]
-        desired_column_order = [corridor_id, 'activity', 'priorityCategory', 'maxStay', 'payment', 'daysOfWeek', 'Days_Active',
-                                'timesOfDay_from', 'timesOfDay_to', 'Hours_Span', 'Weekly_Hours', 'Linear_Feet', 'Linear_Feet_Hours']
-        stats = {"Linear_Feet": "sum", "Linear_Feet_Hours": "sum"}
-        try:
-            corridor_summary = corridor_df.fillna(0).groupby(
-                [corridor_id, "activity", "priorityCategory", "maxStay", "payment", "daysOfWeek", "Days_Active", "timesOfDay_from",
-                    "timesOfDay_to", "Hours_Span", "Weekly_Hours"]).agg(stats)
-        except KeyError:
-            arcpy.AddWarning("""Curb features could not be summarized by corridor. Check a few things:
-                                1. Make sure the corridor ID field names match between the centerline feature class and the curbside routes created by tool.
-                                2. Make sure that the curbside features have the appropriate fields derived from tool 1.
-                                3. Check the temporal extent of the data. There maybe be no days selected with the features under study.""")
-            return None
-            
-        corridor_summary = corridor_summary.reset_index()[desired_column_order]
-        corridor_summary = corridor_summary.sort_values(by='Linear_Feet_Hours', ascending=False)
-        corridor_summary["Summary_ID"] = np.arange(len(corridor_summary)) + 1
-        row_numbers = corridor_summary["Summary_ID"].unique()
-        corridor_row = None
-        for rid in row_numbers:
-            try:
-                row_df = corridor_summary[corridor_summary["Summary_ID"] == rid].copy()
-                final_field_names = [str(i).replace("_1_", "_{0}_".format(str(rid))) for i in new_field_names]
-                row_df[final_field_names] = row_df[desired_column_order]
-                row_df = row_df.drop(columns=desired_column_order[1:] + ["Summary_ID"])  # Drop all but corridor ID
-                if corridor_row is None:
-                    row_df.reset_index(drop=True, inplace=True)
-                    corridor_row = row_df
-                else:
-                    row_df = row_df.drop(columns=[corridor_id])
-                    row_df.reset_index(drop=True, inplace=True)
-                    corridor_row = pd.concat([corridor_row, row_df], axis=1, sort=True)
-            except:
-                arcpy.AddWarning("Could not identify corridor at corridor id {0}.".format(corridor))
-        if final_corridor_df is None:
-            final_corridor_df = corridor_row
-        else:
-            final_corridor_df = pd.concat([final_corridor_df, corridor_row], axis=0, sort=False)
+    # construct a regex pattern for use with Series.str.count() to count
+    # how many of the requested days of week each regulation is active on
+    # the pattern is compiled once and applied to the daysOfWeek column of the candidates in one str.count call
+    days_analyzed_query = re.compile("|".join(day_dict.get(i) for i in days_of_week_analyzed))
+    days_active = curb_df["daysOfWeek"].iloc[candidate_positions].str.count(days_analyzed_query)
+    active = (days_active > 0).to_numpy()
+    curb_df = curb_df.iloc[candidate_positions[active]].copy()
+    curb_df["Days_Active"] = days_active.to_numpy()[active]
+
+    # manually collected curb datasets will not have the _dt columns so we must create them here
+    if 'timesOfDay_from_dt' not in curb_df.columns:
+        curb_df['timesOfDay_from_dt'] = times_of_day_to_datetime(curb_df['timesOfDay_from'])
+        curb_df['timesOfDay_to_dt'] = times_of_day_to_datetime(curb_df['timesOfDay_to'])
+    curb_df["Hours_Span"] = (curb_df["timesOfDay_to_dt"] - curb_df["timesOfDay_from_dt"]).dt.total_seconds() / 3600
+    curb_df["Weekly_Hours"] = curb_df["Hours_Span"] * curb_df["Days_Active"]
+    curb_df["Linear_Feet_Hours"] = curb_df["Weekly_Hours"] * curb_df["Linear_Feet"]
+    desired_column_order = [corridor_id, 'activity', 'priorityCategory', 'maxStay', 'payment', 'daysOfWeek', 'Days_Active',
+                            'timesOfDay_from', 'timesOfDay_to', 'Hours_Span', 'Weekly_Hours', 'Linear_Feet', 'Linear_Feet_Hours']
+    stats = {"Linear_Feet": "sum", "Linear_Feet_Hours": "sum"}
+    group_fields = [corridor_id, "activity", "priorityCategory", "maxStay", "payment", "daysOfWeek", "Days_Active",
+                    "timesOfDay_from", "timesOfDay_to", "Hours_Span", "Weekly_Hours"]
+    try:
+        # nulls are filled only in the group fields (the summed fields skip nulls), rather than copying every column
+        curb_df[group_fields] = curb_df[group_fields].fillna(0)
+        curb_summary = curb_df.groupby(group_fields).agg(stats)
+    except KeyError:
+        arcpy.AddWarning("""Curb features could not be summarized by corridor. Check a few things:
+                            1. Make sure the corridor ID field names match between the centerline feature class and the curbside routes created by tool.
+                            2. Make sure that the curbside features have the appropriate fields derived from tool 1.
+                            3. Check the temporal extent of the data. There maybe be no days selected with the features under study.""")
+        return None
+
+    # Rank each corridor's summaries by Linear_Feet_Hours (the stable sort keeps the groupby order for ties)
+    curb_summary = curb_summary.reset_index()[desired_column_order]
+    curb_summary = curb_summary.sort_values(by=[corridor_id, 'Linear_Feet_Hours'], ascending=[True, False],
+                                            kind='mergesort')
+    curb_summary["Summary_ID"] = curb_summary.groupby(corridor_id).cumcount() + 1
+    # Widen the summaries into one row per corridor, with the fields of each ranked summary side by side
+    # (Curb_Alloc_1_* for the highest Linear_Feet_Hours, then Curb_Alloc_2_*, ...)
+    arc_print("Processing and combining corridor summaries...", True)
+    final_corridor_df = None
+    if len(curb_summary):
+        summary_fields = desired_column_order[1:]
+        wide = curb_summary.set_index([corridor_id, "Summary_ID"])[summary_fields].unstack("Summary_ID")
+        summary_ids = range(1, curb_summary["Summary_ID"].max() + 1)
+        wide = wide.reindex(columns=[(field, rid) for rid in summary_ids for field in summary_fields])
+        wide.columns = [name.replace("_1_", "_{0}_".format(rid)) for rid in summary_ids for name in new_field_names[1:]]
+        final_corridor_df = wide.reset_index()
     if final_corridor_df is None:
         arcpy.AddWarning("No curbside features of the appropriate day or extent could be processed.")
     else:
@@ -38,71 +38,103 @@ def arc_print(string, progressor_bool=False):
     arcpy.AddMessage(casted_string)
     print(casted_string)
 
+def arcgis_table_to_df(in_fc, input_fields=None, query=""):
+    """Function will convert an arcgis table into a pandas dataframe with an object ID index, and the selected
+    input fields using an arcpy.da.SearchCursor.
+    :param - in_fc - input feature class or table to convert
+    :param - input_fields - fields to input to a da search cursor for retrieval
+    :param - query - sql query to grab appropriate values
+    :returns - pandas.DataFrame"""
+    OIDFieldName = arcpy.Describe(in_fc).OIDFieldName
+    if input_fields:
+        final_fields = [OIDFieldName] + input_fields
+    else:
+        final_fields = [field.name for field in arcpy.ListFields(in_fc)
+                        if field.type not in ("Geometry", "Blob", "Raster")]
+    with arcpy.da.SearchCursor(in_fc, final_fields, where_clause=query) as cursor:
+        fc_dataframe = pd.DataFrame.from_records(cursor, columns=final_fields)
+    fc_dataframe = fc_dataframe.set_index(OIDFieldName, drop=True)
+    return fc_dataframe
+
 
-def modal_priority_sieve(row):
+# Modes that have a success metric field
+success_metric_modes = ['Bicycle', 'Pedestrian', 'Transit', 'Commerce', 'Storage', 'Automobility', 'Ridehail']
+
+def modal_priority_sieve(segments, treatments):
     """
-    This function takes a row and checks where the modal priority applicable matches with the value of the modal priority columns. 
-    When it matches, it further checks out if the modal priority column number falls withun appropriate priority rank range. If it 
-    passes the test, it will return 1 otherwise 0. 
-    :param - row
-    :return - boolean array (1s and 0s)
+    This function checks where the modal priority applicable of each treatment matches with the value of the modal
+    priority columns of each segment. When it matches, it further checks out if the modal priority column number falls
+    within appropriate priority rank range. Combinations that pass the test get 1, otherwise 0.
+    :param - segments - segment table
+    :param - treatments - treatment table
+    :return - boolean array (1s and 0s) with a row for each segment and a column for each treatment
     """
-    mode = row["Mode Priority Applicable"]
-    # Initialize rank to a value that will never satisfy the rank_range criterion below.
-    # This way even if the modal priority applicable is not ranked for a certain segment,
-    # this sieve will simply return 0 rather than crashing.
-    rank = -1
-    for i in range(1, 8):
-        if row["Modal_Priority_" + str(i)] == mode:
-            rank = i
-    rank_range = row["Appropriate Priority Rank Range"].split("-")
-    if rank >= int(rank_range[0]) and rank <= int(rank_range[1]):
-        return 1
-    else:
-        return 0
-
-def land_use_sieve(row):
-    """This function takes a row and checks if a treatments land use orientation is one of those identified as a
-    predominant land use on a corridor."""
-    land_uses = [i.strip() for i in row["Appropriate Land Use"].split(",")]
-    if row["Land_Use"] in land_uses:
-        return 1
-    else:
-        return 0
+    # The modal priorities and the modal priority applicable share one categorical dtype, so their codes are compared
+    modal_priorities = np.column_stack([segments['Modal_Priority_' + str(i)].cat.codes for i in range(1, 8)])
+    mode = treatments["Mode Priority Applicable"].cat.codes.to_numpy()[None, :, None]
+    # A missing mode (code -1) never matches a missing modal priority
+    matches = (modal_priorities[:, None, :] == mode) & (mode >= 0)
+    # The last matching column gives the rank. The rank stays -1 where the modal priority applicable is not
+    # ranked for a certain segment, which never satisfies the rank_range criterion below.
+    rank = np.where(matches.any(axis=2), 7 - matches[:, :, ::-1].argmax(axis=2), -1)
+    # Each distinct rank range is split once, a missing rank range (code -1) gets a range no rank satisfies
+    codes, rank_ranges = pd.factorize(treatments["Appropriate Priority Rank Range"])
+    rank_range = np.array([[int(i) for i in rank_range.split("-")] for rank_range in rank_ranges] + [[0, -1]])[codes]
+    return ((rank >= rank_range[:, 0]) & (rank <= rank_range[:, 1])).astype(np.int8)
 
-def place_type_sieve(row):
-    """This function takes a row and checks if a placetype meets the minimum multimodal orientation and density
-    required for a treatment. This is done by checking for the place types number and making sure the treatment is
-    in a place type as dense or denser as the used floor. """
+def land_use_sieve(segments, treatments):
+    """This function checks if a treatments land use orientation is one of those identified as a predominant land use
+    on a corridor. The appropriate land uses of each treatment are split once and checked against each land use
+    category of the segments."""
+    land_uses = segments["Land_Use"].cat
+    allowed = [[land_use in {i.strip() for i in appropriate_land_use.split(",")} for land_use in land_uses.categories]
+               + [False] for appropriate_land_use in treatments["Appropriate Land Use"]]
+    # Code -1 (missing land use) picks the False at the end
+    allowed = np.array(allowed, dtype=bool).reshape(len(treatments), len(land_uses.categories) + 1)
+    return allowed[:, land_uses.codes.to_numpy()].T.astype(np.int8)
 
-    place_types = int("".join(filter(str.isdigit, row["Place Types"])))
-    data_place_type = int("".join(filter(str.isdigit, row["Place_Type"])))
-    if data_place_type <= place_types:
-        return 1
-    else:
-        return 0
+def parse_digits(values):
+    """This function takes a series of strings and returns the integer made of the digits in each string. Each
+    distinct string is only parsed once.
+    :param - values - series of strings such as place types or ROW widths
+    :return - array of integers (as floats, missing strings are NaN)"""
+    codes, distinct_values = pd.factorize(values)
+    parsed_values = [int("".join(filter(str.isdigit, value))) for value in distinct_values]
+    # Code -1 (missing string) picks the NaN at the end
+    return np.array(parsed_values + [np.nan])[codes]
 
-def row_available_sieve(row):
-    """This function takes a row and checks if the right-of-way available meets the minimum identified for the treatment."""
-    necessary_row = int("".join(filter(str.isdigit, row["Total ROW Necessary Per Direction"]))) * 0.3048 # convert feet (treatment table unit) to meters (shared-row unit)!!!
-    if row["Available_ROW"]>= necessary_row:
-        return 1
-    else:
-        return 0
-
-def success_metric_sieve(row):
-    """This function takes a row and checks if a success metric for a corresponding modal priority is already met. If a
-    success metric is a 1, then all treatments that relate to that modal priority are not considered."""
-    mode = str(row["Mode Priority Applicable"])
-    success_col =  "{0}_Success_Metric".format(mode)
-    try:
-        success_value = row[success_col]
-    except:
-        success_value = 0
-    return 1 - success_value # 0 if success_value == 1, 1 otherwise
+def place_type_sieve(segments, treatments):
+    """This function checks if a placetype meets the minimum multimodal orientation and density required for a
+    treatment. This is done by checking for the place types number and making sure the treatment is in a place type
+    as dense or denser as the used floor. """
+    place_types = parse_digits(treatments["Place Types"])
+    data_place_type = parse_digits(segments["Place_Type"])
+    return (data_place_type[:, None] <= place_types).astype(np.int8)
+
+def row_available_sieve(segments, treatments):
+    """This function checks if the right-of-way available meets the minimum identified for the treatment."""
+    necessary_row = parse_digits(treatments["Total ROW Necessary Per Direction"]) * 0.3048 # convert feet (treatment table unit) to meters (shared-row unit)!!!
+    return (segments["Available_ROW"].to_numpy()[:, None] >= necessary_row).astype(np.int8)
+
+def success_metric_sieve(segments, treatments):
+    """This function checks if a success metric for a corresponding modal priority is already met. If a success metric
+    is a 1, then all treatments that relate to that modal priority are not considered. The success metric column of
+    each treatment's mode is gathered from the segments in one step."""
+    success_metrics = segments[['{}_Success_Metric'.format(mode) for mode in success_metric_modes]].to_numpy()
+    # The success metric column of each mode category, -1 for modes without one and for missing modes (code -1)
+    modes = treatments["Mode Priority Applicable"].cat
+    category_index = [success_metric_modes.index(mode) if mode in success_metric_modes else -1
+                      for mode in modes.categories]
+    mode_index = np.array(category_index + [-1], dtype=int)[modes.codes.to_numpy()]
+    columns = np.flatnonzero(mode_index >= 0)
+    # Modes without a success metric column keep a success value of 0
+    success_values = np.zeros((len(segments), len(treatments)), dtype=success_metrics.dtype)
+    success_values[:, columns] = success_metrics[:, mode_index[columns]]
+    return (success_values == 0).astype(np.int8) # 0 if success_value == 1, 1 otherwise
 
 # Global sieves dict makes it easier to work with arbitrarily many sieves later.
-# The key:value format is field_name:function. Each function must accept one argument (row).
+# The key:value format is field_name:function. Each function must accept two arguments (the segment and treatment
+# tables) and return a value for each segment (row) and treatment (column).
 sieves = {'Modal_Priority_Sieve': modal_priority_sieve,
           'Land_Use_Sieve': land_use_sieve,
           'Place_Type_Sieve': place_type_sieve,
@@ -111,28 +143,20 @@ sieves = {'Modal_Priority_Sieve': modal_priority_sieve,
           }
 
 
-def create_intermediate_table(data_df, treatment_df, segment_id_col, treatment_id_col="Treatment_ID", treatment_name_col = "Treatments"):
+def iterate_intermediate_tables(data_df, treatment_df, segment_id_col, treatment_id_col="Treatment_ID",
+                                treatment_name_col="Treatments", chunk_size=10000, applied_only=False):
     """
-    This function generates a skeleton for intermediate table by combining each treatment ID with each object ID.
+    This function generates the intermediate table in chunks of segments by combining each treatment ID with each
+    object ID of the chunk, so only one chunk of the Cartesian product is held in memory at a time.
     :param - data_df - a dataframe which has segments with different modal priorities
     :param - treatment_df - a separate csv file which has individual treatments and associated applicable modal priority, 
     modal priority ranking range, and MOEs.
-    :return -  treatment_intermediate - intermediate output file where for each segment, 26 treatments are stored and a boolean sieve
-    checks out if the treatment is applicable contingent upon each criterion.
+    :param - chunk_size - number of segments combined with the treatments in each chunk
+    :param - applied_only - if true, only the combinations where the treatment is applied are kept
+    :return - generator of treatment_intermediate chunks, where for each segment, 26 treatments are stored and a boolean
+    sieve checks out if the treatment is applicable contingent upon each criterion.
     """
-    ## First generate the Cartesian product (all possible combinations) of segments and treatments
-    # There are probably more compact ways to do this (see https://gist.github.com/internaut/5a653317688b14fd0fc67214c1352831 )
-    # but this works just fine and controls which columns are preserved in the intermediate table
-    treatment_intermediate = {segment_id_col: [], treatment_id_col: [], treatment_name_col : []}
-    for oid in data_df[segment_id_col]:
-        for i in range(len(treatment_df)):
-            treatment_intermediate[segment_id_col].append(oid)
-            treatment_intermediate[treatment_id_col].append(treatment_df.loc[i,treatment_id_col])
-            treatment_intermediate[treatment_name_col].append(treatment_df.loc[i,treatment_name_col])
-
-    treatment_intermediate = pd.DataFrame(treatment_intermediate)
-
-    # Now we gradually construct a list of columns to select from data_df
+    # First we gradually construct a list of columns to select from data_df
     # Start with the segment ID field
     cols_to_select = [segment_id_col]
 
@@ -148,76 +172,113 @@ def create_intermediate_table(data_df, treatment_df, segment_id_col, treatment_i
     cols_to_select.extend(["Place_Type", "Available_ROW", "Land_Use"])
 
     # Missing success metrics become 0 (success metric not met)
-    success_metrics = ['{}_Success_Metric'.format(mode) for mode in ['Bicycle', 'Pedestrian', 'Transit', 'Commerce',
-                                                                     'Storage', 'Automobility', 'Ridehail']]
+    success_metrics = ['{}_Success_Metric'.format(mode) for mode in success_metric_modes]
     for field in success_metrics:
         if field not in data_df.columns:
             data_df[field] = 0
     cols_to_select.extend(success_metrics)
 
-    data_sliced = data_df[cols_to_select]
-    treatment_intermediate = pd.merge(treatment_intermediate, data_sliced, on=segment_id_col, how="left")
-    treatment_sliced = treatment_df[
-        [treatment_id_col, "Mode Priority Applicable", "Appropriate Priority Rank Range", "Place Types",
-         "Appropriate Land Use", "Total ROW Necessary Per Direction"]]
-    treatment_intermediate = pd.merge(treatment_intermediate, treatment_sliced, on=treatment_id_col, how="left")
-    
-    ## Apply All Sieve Functions
-    # Each sieve considers, row-wise, certain columns in treatment_intermediate (i.e. 
-    # certain fields that came from centerline_feature_class and treatment_table_file) 
-    # and returns 0 or 1 depending on whether the sieve's criterion is satisfied, i.e.
-    # whether the row's treatment is applicable for the row's centerline segment.
-    for sieve_name, sieve in sieves.items():
-        treatment_intermediate[sieve_name] = treatment_intermediate.apply(sieve, axis=1)
-
-    # Identify Fields to Drop & Clean Up
-    treatment_intermediate = treatment_intermediate.drop(modal_priorities + 
-        ["Mode Priority Applicable", "Appropriate Priority Rank Range", "Place Types",
-         "Appropriate Land Use", "Total ROW Necessary Per Direction"], axis=1)
-    # Sum All Boolean Sieve Fields, Filter if Sum < number of criteria
-    sieve_columns = sieves.keys()
-    treatment_intermediate["Sum_Sieve"] = treatment_intermediate[sieve_columns].sum(axis=1)
-    treatment_intermediate["Treatment_Applied"] = np.where(len(sieves) == treatment_intermediate["Sum_Sieve"], 1, 0)
-    return treatment_intermediate
+    treatment_cols_to_select = [treatment_id_col, treatment_name_col, "Mode Priority Applicable",
+                                "Appropriate Priority Rank Range", "Place Types", "Appropriate Land Use",
+                                "Total ROW Necessary Per Direction"]
+
+    # The low cardinality text fields, including the treatment names, are stored as categories so the Cartesian
+    # product below holds integer codes instead of repeating strings. Modes share one dtype so the modal priority
+    # sieve can compare codes.
+    mode_values = pd.concat([data_df[field] for field in modal_priorities] + [treatment_df["Mode Priority Applicable"]])
+    mode_dtype = pd.CategoricalDtype(mode_values.dropna().unique())
+    data_dtypes = {field: mode_dtype for field in modal_priorities}
+    data_dtypes.update({"Place_Type": "category", "Land_Use": "category"})
+    data_sliced = data_df[cols_to_select].astype(data_dtypes)
+    treatment_sliced = treatment_df[treatment_cols_to_select].astype({treatment_name_col: "category",
+                                                                      "Mode Priority Applicable": mode_dtype})
+    # The modal priorities and treatment criteria are only read by the sieves, so they are left out of the intermediate
+    # table. The treatment ID and name follow the segment ID in the intermediate table.
+    segment_cols_kept = [field for field in cols_to_select if field not in modal_priorities]
+    intermediate_cols = segment_cols_kept[:1] + treatment_cols_to_select[:2] + segment_cols_kept[1:]
+    treatment_kept = treatment_sliced[treatment_cols_to_select[:2]]
+
+    # An empty segment table still yields one (empty) chunk
+    for start in range(0, max(len(data_sliced), 1), chunk_size):
+        data_chunk = data_sliced.iloc[start:start + chunk_size]
+
+        ## Apply All Sieve Functions
+        # Each sieve considers certain fields of the segments (from centerline_feature_class) and of the treatments
+        # (from treatment_table_file) and returns 0 or 1 for each segment and treatment depending on whether the
+        # sieve's criterion is satisfied, i.e. whether the treatment is applicable for the centerline segment.
+        sieve_results = {sieve_name: sieve(data_chunk, treatment_sliced).ravel() for sieve_name, sieve in sieves.items()}
+        # A treatment is only applied if every criterion is met
+        applied = np.logical_and.reduce(list(sieve_results.values()))
+
+        ## Generate the Cartesian product (all possible combinations) of the chunk's segments and the treatments
+        # Flattening the segments x treatments sieve results row by row gives the position of each combination, so
+        # only the segments and treatments at the kept positions are gathered
+        positions = np.flatnonzero(applied) if applied_only else np.arange(len(applied))
+        segment_positions, treatment_positions = np.divmod(positions, len(treatment_kept))
+        # Each column is taken straight from its backing array, so the table is built in one step
+        intermediate_columns = {field: data_chunk[field].array.take(segment_positions) for field in segment_cols_kept}
+        intermediate_columns.update({field: treatment_kept[field].array.take(treatment_positions)
+                                     for field in treatment_kept.columns})
+        intermediate_columns = {field: intermediate_columns[field] for field in intermediate_cols}
+        for sieve_name, sieve_result in sieve_results.items():
+            intermediate_columns[sieve_name] = sieve_result[positions]
+
+        # Sum All Boolean Sieve Fields for review
+        intermediate_columns["Sum_Sieve"] = sum(sieve_results.values())[positions].astype(np.int8)
+        intermediate_columns["Treatment_Applied"] = applied[positions].astype(np.int8)
+        treatment_intermediate = pd.DataFrame(intermediate_columns)
+        yield treatment_intermediate
+
+
+def create_intermediate_table(data_df, treatment_df, segment_id_col, treatment_id_col="Treatment_ID", treatment_name_col = "Treatments"):
+    """
+    This function generates a skeleton for intermediate table by combining each treatment ID with each object ID.
+    :param - data_df - a dataframe which has segments with different modal priorities
+    :param - treatment_df - a separate csv file which has individual treatments and associated applicable modal priority, 
+    modal priority ranking range, and MOEs.
+    :return -  treatment_intermediate - intermediate output file where for each segment, 26 treatments are stored and a boolean sieve
+    checks out if the treatment is applicable contingent upon each criterion.
+    """
+    return pd.concat(iterate_intermediate_tables(data_df, treatment_df, segment_id_col, treatment_id_col,
+                                                 treatment_name_col), ignore_index=True)
 
 
 def identify_curbside_treatments_by_segment(treatment_df, treatment_intermediate, segment_id_col,
-                                            treatment_id_col="Treatment_ID", treatment_name_col = "Treatments"):
+                                            treatment_id_col="Treatment_ID", treatment_name_col = "Treatments",
+                                            segment_ids=None):
     """
     This function takes the treatment csv file and the intermediate output file to create final output where for each segment all 
     the possible treatment IDs are stored and associated MOEs are saved as well. 
     :param - treatment_df -  a separate csv file which has individual treatments and associated applicable modal priority, 
     modal priority ranking range, and MOEs.
     :param - treatment_intermediate - intermediate output file where for each segment, 26 treatments are stored and a boolean sieve
-    checks out if the treatment is applicable contingent upon each criterion. 
+    checks out if the treatment is applicable contingent upon each criterion. Only the applied rows are required.
+    :param - segment_ids - segment IDs to report, which defaults to the segment IDs in treatment_intermediate
     :return - output_df - treatment ids for each segment, possible MOEs for each treatment. 
     """
-    treatment_moes = {}
     print("Processing treatment MOEs...")
-    for i in range(len(treatment_df)):
-        treatment_moes[treatment_df.loc[i, treatment_id_col]] = treatment_df.loc[i, "Measures of Effectiveness"].split(",")
-    output_df = {segment_id_col: [], "TreatmentID": [], "Treatments": []}
-
-    for treatment_number in range(1, 27):
-        col_moe = "Treatment_{0}_MOEs".format(str(treatment_number))
-        output_df[col_moe] = []
+    # The MOE string of each treatment is built once and looked up for every segment it is applied to
+    treatment_moes = {treatment_id: ";".join(moes.split(",")) for treatment_id, moes in
+                      zip(treatment_df[treatment_id_col], treatment_df["Measures of Effectiveness"])}
     print("Creating identified segments...")
-    grouped = treatment_intermediate.groupby(segment_id_col)
-    for name, group in grouped:
-        applied_df = group[group["Treatment_Applied"] == 1]
-        treatments = list(applied_df[treatment_id_col])
-        treatment_string = ";".join(map(str, treatments))
-        treatment_names = list(applied_df[treatment_name_col])
-        treatment_names_string = ";".join(treatment_names)
-        output_df[segment_id_col].append(name)
-        output_df["TreatmentID"].append(treatment_string)
-        output_df["Treatments"].append(treatment_names_string)
-        for i in range(1, 27):
-            if i in treatments:
-                output_df["Treatment_{0}_MOEs".format(str(i))].append(";".join(treatment_moes[i]))
-            else:
-                output_df["Treatment_{0}_MOEs".format(str(i))].append(np.nan)
-    output_df = pd.DataFrame(output_df)
+    if segment_ids is None:
+        segment_ids = treatment_intermediate[segment_id_col]
+    segment_ids = pd.Index(pd.Series(segment_ids).dropna().unique()).sort_values()
+    applied_df = treatment_intermediate[treatment_intermediate["Treatment_Applied"] == 1]
+    grouped = applied_df.groupby(segment_id_col, sort=False)
+    treatment_strings = grouped[treatment_id_col].agg(lambda treatments: ";".join(map(str, treatments)))
+    treatment_names_strings = grouped[treatment_name_col].agg(";".join)
+    # Segments without any applied treatment get empty treatment strings
+    output_df = pd.DataFrame({"TreatmentID": treatment_strings, "Treatments": treatment_names_strings})
+    output_df = output_df.astype(object).reindex(segment_ids).fillna("")
+    # The MOEs of each applied treatment are pivoted to one column per treatment, which is empty where the
+    # treatment is not applied to a segment
+    moe_df = applied_df[applied_df[treatment_id_col].isin(range(1, 27))]
+    moes = moe_df[treatment_id_col].map(treatment_moes)
+    moes.index = pd.MultiIndex.from_arrays([moe_df[segment_id_col], moe_df[treatment_id_col]])
+    moes = moes.unstack().reindex(index=segment_ids, columns=range(1, 27))
+    moes.columns = ["Treatment_{0}_MOEs".format(str(i)) for i in range(1, 27)]
+    output_df = output_df.join(moes).rename_axis(segment_id_col).reset_index()
     return output_df
 
 
@@ -241,24 +302,44 @@ def identify_curbside_treatments_to_feature_class(centerline_feature_class, outp
     :param - output_intermediate_csv - This optional output CSV will provide an intermediate and inspectable output
     table that identifies exactly why different treatments were identified and selected given its treatment selection
     criteria in the treatment table."""
-    data_df = pd.DataFrame().spatial.from_featureclass(centerline_feature_class).reset_index()
+    oid_col = str(arcpy.Describe(centerline_feature_class).OIDFieldName)
+    # Only the fields read by the sieves are loaded to identify treatments. The full feature class, with its geometry,
+    # is read once the treatments are identified.
+    sieve_fields = [field.name for field in arcpy.ListFields(centerline_feature_class)
+                    if field.name.startswith("Modal_Priority_") or field.name.endswith("_Success_Metric")
+                    or field.name in ("Place_Type", "Available_ROW", "Land_Use")]
+    data_df = arcgis_table_to_df(centerline_feature_class, sieve_fields).reset_index()
     dirname = os.path.dirname(__file__) # Get path from python file
     treatment_table_path = str(treatment_table_file)
     arc_print("Reading in treatment table...", True)
     treatment_df = pd.read_excel(treatment_table_path)
     arc_print("Identifying contextually appropriate treatments...", True)
-    oid_col = str(arcpy.Describe(centerline_feature_class).OIDFieldName)
-    treatment_intermediate = create_intermediate_table(data_df, treatment_df, oid_col)
-    if arcpy.Exists(os.path.dirname(output_intermediate_csv)):
+    export_intermediate = arcpy.Exists(os.path.dirname(output_intermediate_csv))
+    if export_intermediate:
         arc_print("Exporting out intermediate CSV which reviews the logic of treatment selections...", True)
-        treatment_intermediate_export = treatment_intermediate.rename(columns={oid_col: "Segment_ID"})
-        treatment_intermediate_export.to_csv(output_intermediate_csv, index=False)
-    output_df = identify_curbside_treatments_by_segment(treatment_df, treatment_intermediate, oid_col)
+    # Each chunk of the intermediate table is appended to the CSV, and only its applied treatments are kept
+    applied_tables = []
+    # Without the CSV, only the applied treatments are gathered from the sieve results
+    intermediate_tables = iterate_intermediate_tables(data_df, treatment_df, oid_col, applied_only=not export_intermediate)
+    for chunk_number, treatment_intermediate in enumerate(intermediate_tables):
+        if export_intermediate:
+            treatment_intermediate_export = treatment_intermediate.rename(columns={oid_col: "Segment_ID"})
+            treatment_intermediate_export.to_csv(output_intermediate_csv, index=False,
+                                                 mode="a" if chunk_number else "w", header=not chunk_number)
+        applied_tables.append(treatment_intermediate[treatment_intermediate["Treatment_Applied"] == 1])
+    applied_treatments = pd.concat(applied_tables, ignore_index=True)
+    output_df = identify_curbside_treatments_by_segment(treatment_df, applied_treatments, oid_col,
+                                                        segment_ids=data_df[oid_col])
     arc_print("Joining output results to primary feature dataframe...")
+    spatial_df = pd.DataFrame().spatial.from_featureclass(centerline_feature_class).reset_index()
+    # Fields the intermediate table filled in for missing modal priorities and success metrics are kept in the output
+    filled_fields = [field for field in data_df.columns if field not in spatial_df.columns]
+    data_df = spatial_df.merge(data_df[[oid_col] + filled_fields], how="left", on=oid_col) if filled_fields else spatial_df
     if explode_by_treatment:
-        applied_treatments = treatment_intermediate[treatment_intermediate["Treatment_Applied"]==1]
         treatment_col_kept = ['OBJECTID','Treatment_ID', 'Treatments']
-        data_df_w_output = data_df.merge(applied_treatments[treatment_col_kept], how="outer", on=oid_col)
+        # The treatment names are written out as text rather than categories
+        applied_treatments = applied_treatments[treatment_col_kept].astype({"Treatments": object})
+        data_df_w_output = data_df.merge(applied_treatments, how="outer", on=oid_col)
         arc_print("Exporting output treatments by segment dataframe to output feature class...", True)
     else:
         data_df_w_output = data_df.merge(output_df, how="left", on=oid_col)
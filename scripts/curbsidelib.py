@@ -27,7 +27,7 @@ import arcpy
 import numpy as np
 import os
 import datetime
-import math
+from functools import lru_cache
 try:
     import pandas as pd
 except:
@@ -77,22 +77,28 @@ def add_new_field(in_table, field_name, field_type, field_precision="#", field_s
 def create_route_field(in_table, route_field, field_type='LONG'):
     if add_new_field(in_table, route_field, field_type):
         oid_field = arcpy.Describe(in_table).OIDFieldName
-        arcpy.management.CalculateField(in_table, route_field, "!{}!".format(oid_field))
+        # the OIDs are copied with one UpdateCursor pass instead of CalculateField's expression engine
+        to_field_value = str if field_type.upper() in ("TEXT", "STRING") else int
+        with arcpy.da.UpdateCursor(in_table, ["OID@", route_field]) as cursor:
+            for oid, _ in cursor:
+                cursor.updateRow((oid, to_field_value(oid)))
         arc_print('Populated field {} with content of field {}'.format(route_field, oid_field))
         return True # True because field was created
     arc_print('Did not modify content of field {}'.format(route_field))
     return False # False because field was not created
 
+@lru_cache(maxsize=1024)
+def validate_field_name(field_name, workspace):
+    """Returns arcpy.ValidateFieldName for a field name and workspace, caching the result since the same column names
+    are validated repeatedly."""
+    return arcpy.ValidateFieldName(field_name, workspace)
+
+
 def validate_df_names(dataframe, output_feature_class_workspace):
     """Returns pandas dataframe with all col names renamed to be valid arcgis table names."""
-    new_name_list = []
-    old_names = dataframe.columns.names
-    for name in old_names:
-        new_name = arcpy.ValidateFieldName(name, output_feature_class_workspace)
-        new_name_list.append(new_name)
-    rename_dict = {i: j for i, j in zip(old_names, new_name_list)}
-    dataframe.rename(index=str, columns=rename_dict)
-    return dataframe
+    old_names = list(dataframe.columns)
+    rename_dict = {i: validate_field_name(str(i), output_feature_class_workspace) for i in old_names}
+    return dataframe.rename(columns=rename_dict)
 
 
 def construct_index_dict(field_names, index_start=0):
@@ -122,30 +128,72 @@ def retrieve_row_values(row, field_names, index_dict):
         row_values.append(value)
     return row_values
 
+def df_to_structured_array(df):
+    """Converts a dataframe to a NumPy structured array that arcpy.da can write, with one field per column.
+    :param - df - dataframe to convert
+    :returns - numpy structured array"""
+    arrays = []
+    for column_name, column in df.items():
+        if column.dtype == bool:
+            arrays.append(column.to_numpy(dtype="i4"))
+        elif column.dtype.kind in "iu" and column.hasnans:
+            arrays.append(column.to_numpy(dtype=float, na_value=np.nan)) # integer gaps are written as NaN
+        elif column.dtype.kind in "iufmM":
+            arrays.append(column.to_numpy())
+        else:
+            # unicode fields cannot hold nulls; restore_text_nulls writes them back after the join
+            arrays.append(column.fillna("").astype(str).to_numpy(dtype=str))
+    return np.rec.fromarrays(arrays, names=[str(column_name) for column_name in df.columns]).view(np.ndarray)
+
+def restore_text_nulls(df, target_feature_class, df_join_field, feature_class_join_field):
+    """Sets the text fields joined from a dataframe back to null where df_to_structured_array wrote empty strings.
+    @:param - df - dataframe that was joined, with its columns named like the joined fields
+    @:param - target_feature_class - the feature class the data was joined to
+    @:param - df_join_field - field in dataframe the join was based on
+    @:param - feature_class_join_field - feature class field the join was based on"""
+    text_columns = [name for name, column in df.items() if name != df_join_field and column.dtype != bool
+                    and column.dtype.kind not in "iufmM" and column.hasnans]
+    if not text_columns:
+        return
+    null_flags = df[text_columns].isna()
+    null_rows = null_flags.any(axis=1).to_numpy()
+    null_dict = dict(zip(df[df_join_field].to_numpy()[null_rows].tolist(),
+                         null_flags.to_numpy()[null_rows].tolist()))
+    with arcpy.da.UpdateCursor(target_feature_class, [feature_class_join_field] + text_columns) as cursor:
+        for row in cursor:
+            flags = null_dict.get(row[0])
+            if flags:
+                cursor.updateRow([row[0]] + [None if is_null else value for value, is_null in zip(row[1:], flags)])
+
 def join_df_columns_to_feature_class(df, target_feature_class, df_join_field,
                                      feature_class_join_field="@OID", join_columns = []):
-    """Will join chosen columns  to a feature class from a dataframe using temporary csvs and in_memory tables.
+    """Will join chosen columns  to a feature class from a dataframe using a NumPy structured array and
+    arcpy.da.ExtendTable, without writing the dataframe to disk. Null text values are restored afterwards by
+    restore_text_nulls.
     @:param - df - dataframe with data to join
     @:param - target_feature_class - the feature class to join data to
-    @:param - df_join_field - field in dataframe to base join
+    @:param - df_join_field - field in dataframe to base join, which may be the name of the dataframe index
     @:param - feature_class_join_field - feature class with the field to base the join. If the
     feature class object ID is chosen with the @OID tag, describe objects will find it.
-    @:param - join_columns - columns to join to the feature class"""
+    @:param - join_columns - columns to join to the feature class, all columns if none are chosen"""
     if feature_class_join_field == "@OID":
         feature_class_join_field = arcpy.Describe(target_feature_class).OIDFieldName
-    temp_folder = arcpy.env.scratchFolder
-    temp_csv = os.path.join(temp_folder,"join_csv.csv")
-    df.to_csv(temp_csv)
-    temp_table = "temp_table"
-    arcpy.TableToTable_conversion(temp_csv,"in_memory",temp_table)
-    temp_table_path = os.path.join("in_memory", temp_table)
-    arcpy.JoinField_management(target_feature_class,feature_class_join_field,temp_table_path,df_join_field,join_columns)
+    if df_join_field not in df.columns:
+        df = df.reset_index()
+    join_columns = join_columns or list(df.columns)
+    join_df = df[[df_join_field] + [i for i in join_columns if i != df_join_field]].copy()
+    # ExtendTable adds a field for every column but the join field, so those must be valid field names
+    workspace = os.path.dirname(target_feature_class)
+    join_df.columns = [df_join_field] + [validate_field_name(str(i), workspace) for i in join_df.columns[1:]]
+    # the join keys must have the same type as the feature class field, e.g. integer IDs that were read as floats
+    join_field_type = arcpy.ListFields(target_feature_class, feature_class_join_field)[0].type
+    if join_field_type in ("OID", "Integer", "SmallInteger"):
+        join_df[df_join_field] = join_df[df_join_field].astype("i4")
+    join_array = df_to_structured_array(join_df)
+    arcpy.da.ExtendTable(target_feature_class, feature_class_join_field, join_array, df_join_field,
+                         append_only=False)
+    restore_text_nulls(join_df, target_feature_class, df_join_field, feature_class_join_field)
     print("Dataframe Fields Joined to Feature Class.")
-    try:
-        os.remove(temp_csv)
-        os.removedirs(temp_folder)
-    except:
-        print("Could not complete a full clean up of the scratchFolder.")
 
 def arcgis_table_to_df(in_fc, input_fields=None, query=""):
     """Function will convert an arcgis table into a pandas dataframe with an object ID index, and the selected
@@ -158,22 +206,31 @@ def arcgis_table_to_df(in_fc, input_fields=None, query=""):
     if input_fields:
         final_fields = [OIDFieldName] + input_fields
     else:
-        final_fields = [field.name for field in arcpy.ListFields(in_fc)]
-    data = [row for row in arcpy.da.SearchCursor(in_fc, final_fields, where_clause=query)]
-    fc_dataframe = pd.DataFrame(data, columns=final_fields)
+        final_fields = [field.name for field in arcpy.ListFields(in_fc)
+                        if field.type not in ("Geometry", "Blob", "Raster")]
+    # a cursor rather than TableToNumPyArray, since NumPy arrays cannot hold nulls in integer and text fields
+    with arcpy.da.SearchCursor(in_fc, final_fields, where_clause=query) as cursor:
+        fc_dataframe = pd.DataFrame.from_records(cursor, columns=final_fields)
     fc_dataframe = fc_dataframe.set_index(OIDFieldName, drop=True)
     return fc_dataframe
 # Curbside Management Function Definitions
 
+def parse_times(HMS_values):
+    '''Convert a sequence of HH:MM:SS strings to seconds since midnight with one vectorized split, for comparison
+    purposes.
+    @:param - HMS_values - a sequence of text strings in the form HH:MM:SS. If one section is missing, it is assumed
+    to be zero.
+    @:returns - float numpy array of seconds since midnight'''
+    sections = pd.Series(HMS_values, dtype=object).astype(str).str.split(":", expand=True)
+    if sections.shape[1] > 3:
+        raise ValueError("Time values must be in the form HH:MM:SS.")
+    sections = sections.reindex(columns=range(3)).fillna(0).astype(float)
+    return sections.to_numpy() @ np.array([3600, 60, 1], dtype=float)
+
 def parse_time(HMS):
     '''Convert HH:MM:SS to seconds since midnight, for comparison purposes.
     @:param - HMS - a text string in the form HH:MM:SS. If one section is missing, it is assumed to be zero. '''
-    values = [i for i in HMS.split(':')]
-    while len(values) < 3:
-        values.append(0)
-    H , M , S = values
-    seconds = (float(H) * 3600) + (float(M) * 60) + float(S)
-    return seconds
+    return float(parse_times([HMS])[0])
 
 def construct_datetime_ranges(time_period_dictionary,days_analyzed, base_date_stamp ="1900-01-01"):
     """This function will create a dictionary of time period/day combinations names with values equal
@@ -189,30 +246,53 @@ def construct_datetime_ranges(time_period_dictionary,days_analyzed, base_date_st
     end datetime tuples. {(period,day):(start_dt,end_dt)}
     """
     arc_print("Constructing time period dictionary to manage times...")
-    time_period_dict_seconds = {}
-    for tp in time_period_dictionary:
-        tp_vals = time_period_dictionary.get(tp,None)
-        tp_seconds = [parse_time(i) for i in tp_vals]
-        time_period_dict_seconds.update({tp:tp_seconds})
+    # every start and end time is parsed in one call, then paired back up with its time period
+    time_period_seconds = parse_times([i for tp_vals in time_period_dictionary.values() for i in tp_vals])
+    time_period_deltas = {}
+    position = 0
+    for tp, tp_vals in time_period_dictionary.items():
+        tp_seconds = time_period_seconds[position:position + len(tp_vals)]
+        position += len(tp_vals)
+        time_period_deltas[tp] = [datetime.timedelta(seconds=float(i)) for i in tp_seconds]
     arc_print("Constructing day-time period ranges...")
     days_text = ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"]
     day_of_week_codes = {i:j for i,j in zip(days_text,range(7))}
+    # The 7 days starting at the base date are keyed by weekday once, rather than for every day analyzed.
+    base_date = pd.Timestamp(base_date_stamp)
+    days_dict = {(base_date.weekday() + i) % 7: base_date + datetime.timedelta(days=i) for i in range(7)}
     new_dt_dict = {}
     for day in days_analyzed:
-        base_date = datetime.datetime.strptime(base_date_stamp, "%Y-%m-%d")
-        datetime_delta_7_days = datetime.timedelta(days=7)
-        future_date = base_date + datetime_delta_7_days
-        days = pd.date_range(base_date_stamp,future_date, freq='D',closed="left").to_list()
-        days_dict = {i.weekday():i for i in days}
         date_time_day = days_dict.get(day_of_week_codes.get(day),0)
-        for period in time_period_dict_seconds:
-            start, end = time_period_dict_seconds.get(period)
-            start_tdt , end_tdt = datetime.timedelta(seconds=start) ,datetime.timedelta(seconds=end)
-            start_dt, end_dt = date_time_day + start_tdt , date_time_day + end_tdt
-            new_key = (period,day)
-            new_dt_dict[new_key] = (start_dt, end_dt)
+        for period, (start_tdt, end_tdt) in time_period_deltas.items():
+            new_dt_dict[(period,day)] = (date_time_day + start_tdt, date_time_day + end_tdt)
     return new_dt_dict
 # ROW Function Definitions
+FEET_TO_M = 0.3048 # fixed conversion from feet to meters!
+# Maximum lane widths used by shared_row_data_evaluator.right_size_row
+MAX_CURB_LANE_M = 11 * FEET_TO_M
+MAX_THRU_LANE_M = 10 * FEET_TO_M
+MAX_PARKING_LANE_M = 8 * FEET_TO_M
+
+def remove_centermost_lanes(lanes, removal_count, lane_check):
+    """This worker function will remove the left most lane (towards center) of every row of a 2D array of lane
+    widths in 1,2,3,4 order, removal_count times, modifying the array in place. Each removal clears the lane before
+    every empty lane for all rows at once with boolean masks.
+    :param - lanes - 2D float array with one row per street and one column per lane
+    :param - removal_count - number of lanes to remove from each row
+    :param - lane_check - index of the lane that is never cleared (0 locks the last lane left for a street)
+    :returns - lanes"""
+    for removal in range(removal_count):
+        empty_lanes = lanes <= 0
+        # an empty first lane clears the lane "before" it, which wraps around to the last lane
+        if lane_check != -1:
+            wrapped = empty_lanes[:, 0]
+            lanes[wrapped, -1] = 0
+            empty_lanes[wrapped, -1] = True
+        cleared_lanes = empty_lanes[:, 1:]
+        if 0 <= lane_check < cleared_lanes.shape[1]:
+            cleared_lanes[:, lane_check] = False
+        lanes[:, :-1][cleared_lanes] = 0
+    return lanes
 
 class shared_row_data_evaluator(object):
     """
@@ -244,6 +324,8 @@ class shared_row_data_evaluator(object):
         assert shared_row_df.index.is_unique, print(
             "Error: Classes depends on a dataframe that has unique index values.")
         self.sr_df = shared_row_df
+        # column presence is checked against a set of the input columns, rather than scanning the column index
+        col_set = set(self.sr_df.columns)
         self.scenario_dfs = {}
         self.added_columns = {"BASELINE_ROW": ["Total_ROW_Width", "Base_Total_ROW_Width", "Unused_ROW_Width",
                                                "Left_Sidewalk_Width", "Right_Sidewalk_Width", "Curb_To_Curb_Width"]}
@@ -252,26 +334,51 @@ class shared_row_data_evaluator(object):
         self.LTL_List.sort()
         self.RTL_List.sort()
         print("Developing ROW Statistics...")
-        self.sr_df["Right_Thru_Lane_Widths"] = self.sr_df[self.RTL_List].sum(axis=1).fillna(0)
-        self.sr_df["Left_Thru_Lane_Widths"] = self.sr_df[self.LTL_List].sum(axis=1).fillna(0)
         self.left_sidewalk_slices = [i for i in ["Left_Sidewalk_Frontage_Zone", "Left_Sidewalk_Through_Zone",
-                                                 "Left_Sidewalk_Furniture_Zone"] if i in self.sr_df]
+                                                 "Left_Sidewalk_Furniture_Zone"] if i in col_set]
         self.left_spec_slices = ["Left_Bike_Lane", "Left_Bike_Buffer", "Left_Parking_Lane", "Left_Transit_Lane"]
         self.center_width_field = ["Center_Lane"]
         self.right_spec_slices = ["Right_Transit_Lane", "Right_Parking_Lane", "Right_Bike_Buffer", "Right_Bike_Lane", ]
         self.right_sidewalk_slices = [i for i in ["Right_Sidewalk_Furniture_Zone", "Right_Sidewalk_Through_Zone",
-                                                  "Right_Sidewalk_Frontage_Zone"] if i in self.sr_df]
+                                                  "Right_Sidewalk_Frontage_Zone"] if i in col_set]
         self.spec_row_fields = self.left_sidewalk_slices + self.left_spec_slices + self.LTL_List + \
                                self.center_width_field + self.RTL_List + self.right_spec_slices \
                                + self.right_sidewalk_slices
-        self.row_slices = [i for i in self.spec_row_fields if i in self.sr_df.columns]
-        self.sr_df["Total_ROW_Width"] = self.sr_df[self.row_slices].sum(axis=1)
-        self.sr_df["Base_Total_ROW_Width"] = self.sr_df["Total_ROW_Width"]
+        self.row_slices = [i for i in self.spec_row_fields if i in col_set]
+        # positions of the lane and sidewalk slices among the row slices, so every width below (and in update_row) is
+        # summed from one array of the row slices (numeric na values were already filled with 0)
+        self.left_sidewalk_positions = [self.row_slices.index(i) for i in self.left_sidewalk_slices]
+        self.right_sidewalk_positions = [self.row_slices.index(i) for i in self.right_sidewalk_slices]
+        row_widths = self.sr_df[self.row_slices].to_numpy(dtype=float)
+        total_row_width = row_widths.sum(axis=1)
+        left_sidewalk_width = row_widths[:, self.left_sidewalk_positions].sum(axis=1)
+        right_sidewalk_width = row_widths[:, self.right_sidewalk_positions].sum(axis=1)
+        right_thru_lanes = row_widths[:, [self.row_slices.index(i) for i in self.RTL_List]]
+        left_thru_lanes = row_widths[:, [self.row_slices.index(i) for i in self.LTL_List]]
+        self.sr_df["Right_Thru_Lane_Widths"] = right_thru_lanes.sum(axis=1)
+        self.sr_df["Left_Thru_Lane_Widths"] = left_thru_lanes.sum(axis=1)
+        self.sr_df["Total_ROW_Width"] = total_row_width
+        self.sr_df["Base_Total_ROW_Width"] = total_row_width
         self.sr_df["Unused_ROW_Width"] = 0
-        self.sr_df["Left_Sidewalk_Width"] = self.sr_df[self.left_sidewalk_slices].sum(axis=1)
-        self.sr_df["Right_Sidewalk_Width"] = self.sr_df[self.right_sidewalk_slices].sum(axis=1)
-        self.sr_df["Curb_To_Curb_Width"] = self.sr_df["Total_ROW_Width"] - (self.sr_df["Left_Sidewalk_Width"] +
-                                                                            self.sr_df["Right_Sidewalk_Width"])
+        self.sr_df["Left_Sidewalk_Width"] = left_sidewalk_width
+        self.sr_df["Right_Sidewalk_Width"] = right_sidewalk_width
+        self.sr_df["Curb_To_Curb_Width"] = total_row_width - (left_sidewalk_width + right_sidewalk_width)
+        # Maximum widths used by right_size_row: 11 feet for curbside through lanes, 10 feet for other through lanes,
+        # and 8 feet for parking lanes
+        right_size_maxes = {lane: MAX_CURB_LANE_M if "1" in lane else MAX_THRU_LANE_M
+                            for lane in self.RTL_List + self.LTL_List}
+        right_size_maxes.update({lane: MAX_PARKING_LANE_M for lane in self.row_slices
+                                 if "Parking" in lane and "Meta" not in lane})
+        self.right_size_lanes = list(right_size_maxes)
+        self.right_size_maxes = np.array(list(right_size_maxes.values()))
+        # Integer positions of the lane and row slice columns, so the methods below read them by position instead of
+        # resolving the label lists on every call. Scenario dataframes are copies of sr_df and only ever gain
+        # columns at the end, so these positions hold for every scenario. Columns are still written back by label,
+        # which lets pandas replace them with the dtype of the new values.
+        self.row_slice_positions = self.sr_df.columns.get_indexer(self.row_slices)
+        self.RTL_positions = self.sr_df.columns.get_indexer(self.RTL_List)
+        self.LTL_positions = self.sr_df.columns.get_indexer(self.LTL_List)
+        self.right_size_positions = self.sr_df.columns.get_indexer(self.right_size_lanes)
 
     def __str__(self):
         return "shared_row_data_evaluator"
@@ -301,22 +408,10 @@ class shared_row_data_evaluator(object):
         through lanes (11 feet for the curbside lane), and parking lanes to a max of 8 feet.
         :param scenario_key - name of scenario as a string or other hashable object"""
         scenario_df = self.scenario_dfs.setdefault(scenario_key, self.sr_df.copy())
-
-        curb_side_lanes = [i for i in self.RTL_List + self.LTL_List if "1" in i]
-        other_thru_lanes = [i for i in self.RTL_List + self.LTL_List if "1" not in i]
-        parking_lanes = [i for i in self.row_slices if "Parking" in i and "Meta" not in i]
-        for oth_thru_lane in curb_side_lanes:
-            curb_side_lane_max = 11 * 0.3048 # fixed conversion from feet to meters!
-            scenario_df[oth_thru_lane] = np.where(scenario_df[oth_thru_lane] > curb_side_lane_max, curb_side_lane_max,
-                                                  scenario_df[oth_thru_lane])
-        for oth_thru_lane in other_thru_lanes:
-            lane_max = 10 * 0.3048 # fixed conversion from feet to meters!
-            scenario_df[oth_thru_lane] = np.where(scenario_df[oth_thru_lane] > lane_max, lane_max,
-                                                  scenario_df[oth_thru_lane])
-        for parking_lane in parking_lanes:
-            park_max = 8 * 0.3048 # fixed conversion from feet to meters!
-            scenario_df[parking_lane] = np.where(scenario_df[parking_lane] > park_max, park_max,
-                                                 scenario_df[parking_lane])
+        # every lane is capped at its maximum width in a single pass over all lane columns
+        if self.right_size_lanes:
+            lanes = scenario_df.iloc[:, self.right_size_positions].to_numpy()
+            scenario_df[self.right_size_lanes] = np.minimum(lanes, self.right_size_maxes)
         self.update_row(scenario_key)
         return scenario_df
 
@@ -335,27 +430,19 @@ class shared_row_data_evaluator(object):
         left_temp_tracker = "Left_Most"
         scenario_df[right_temp_tracker] = 0
         scenario_df[left_temp_tracker] = 0
-        def remove_centermost_lane(row, lock_last_lane = lock_last_lane):
-            """This worker function will remove the left most lane (towards center) assuming a list of lane
-             values are passed in 1,2,3,4 order. """
-            if lock_last_lane:
-                lane_check = 0
-            else:
-                lane_check = -1
-            for idx, value in enumerate(row):
-                if value <= 0 and (idx-1) != lane_check:
-                    row[idx-1] = 0
-                elif idx == len(row)+1:
-                    row[idx] = 0
-                else:
-                    pass
-            return row
+        if lock_last_lane:
+            lane_check = 0
+        else:
+            lane_check = -1
         right_lanes_to_remove = int(round(lane_removal_count/2.0,0))
         left_lanes_to_remove = int(lane_removal_count/2.0)
-        for i in range(right_lanes_to_remove):
-            scenario_df[self.RTL_List] = scenario_df[self.RTL_List].apply(remove_centermost_lane,axis=1)
-        for i in range(left_lanes_to_remove):
-            scenario_df[self.LTL_List] = scenario_df[self.LTL_List].apply(remove_centermost_lane,axis=1)
+        # all removals are applied to the lane widths as one array, rather than row by row through DataFrame.apply
+        if self.RTL_List and right_lanes_to_remove:
+            lanes = scenario_df.iloc[:, self.RTL_positions].to_numpy(dtype=float, copy=True)
+            scenario_df[self.RTL_List] = remove_centermost_lanes(lanes, right_lanes_to_remove, lane_check)
+        if self.LTL_List and left_lanes_to_remove:
+            lanes = scenario_df.iloc[:, self.LTL_positions].to_numpy(dtype=float, copy=True)
+            scenario_df[self.LTL_List] = remove_centermost_lanes(lanes, left_lanes_to_remove, lane_check)
         self.update_row(scenario_key)
         return scenario_df
 
@@ -384,7 +471,6 @@ class shared_row_data_evaluator(object):
         @:param - right_lane_name - name of output lane field
         @:param - left_lane_name - name of output lane field
         @:param - total_lane_name - name of output lane field"""
-        right_lanes_df, left_lanes_df = None, None
         if scenario in self.scenario_dfs:
             main_df = self.scenario_dfs.get(scenario)
             added_columns = self.added_columns.get(scenario, [])
@@ -394,19 +480,13 @@ class shared_row_data_evaluator(object):
             added_columns = self.added_columns.get("BASELINE_ROW", [])
             added_columns.extend([right_lane_name, left_lane_name, total_lanes_name])
         print("Identifying lanes...")
-        for l_lane, r_lane in zip(self.LTL_List, self.RTL_List):
-            right_binary_column = pd.Series(np.where(main_df[r_lane] > 0, 1, 0), name=r_lane)
-            left_binary_column = pd.Series(np.where(main_df[l_lane] > 0, 1, 0), name=l_lane)
-            if right_lanes_df is None or left_lanes_df is None:
-                right_lanes_df = right_binary_column
-                left_lanes_df = left_binary_column
-            else:
-                right_lanes_df = pd.concat([right_lanes_df, right_binary_column], axis=1)
-                left_lanes_df = pd.concat([left_lanes_df, left_binary_column], axis=1)
-        main_df[right_lane_name] = right_lanes_df.sum(axis=1).fillna(0)
-        main_df[left_lane_name] = left_lanes_df.sum(axis=1).fillna(0)
+        # lanes are counted over matching pairs of left and right lanes, as widths greater than 0
+        lane_pairs = min(len(self.LTL_List), len(self.RTL_List))
+        right_lanes = main_df.iloc[:, self.RTL_positions[:lane_pairs]].to_numpy()
+        left_lanes = main_df.iloc[:, self.LTL_positions[:lane_pairs]].to_numpy()
+        main_df[right_lane_name] = (right_lanes > 0).sum(axis=1)
+        main_df[left_lane_name] = (left_lanes > 0).sum(axis=1)
         main_df[total_lanes_name] = main_df[left_lane_name] + main_df[right_lane_name]
-        del right_lanes_df, left_lanes_df
 
     def update_row(self, scenario):
         """Update the ROW Calculations for a chosen scenario. Used anytime an editor function is called.
@@ -416,10 +496,12 @@ class shared_row_data_evaluator(object):
             self.added_columns.setdefault(scenario, self.added_columns.get("BASELINE_ROW"))
         else:
             scen_df = self.sr_df
-        scen_df["Total_ROW_Width"] = scen_df[self.row_slices].sum(axis=1)
+        # the row slices are read into one array once, and every width below is summed from it
+        row_widths = scen_df.iloc[:, self.row_slice_positions].to_numpy(dtype=float, na_value=0.0)
+        scen_df["Total_ROW_Width"] = row_widths.sum(axis=1)
         scen_df["Unused_ROW_Width"] = scen_df["Base_Total_ROW_Width"] - scen_df["Total_ROW_Width"]
-        scen_df["Left_Sidewalk_Width"] = scen_df[self.left_sidewalk_slices].sum(axis=1)
-        scen_df["Right_Sidewalk_Width"] = scen_df[self.right_sidewalk_slices].sum(axis=1)
+        scen_df["Left_Sidewalk_Width"] = row_widths[:, self.left_sidewalk_positions].sum(axis=1)
+        scen_df["Right_Sidewalk_Width"] = row_widths[:, self.right_sidewalk_positions].sum(axis=1)
         scen_df["Curb_To_Curb_Width"] = (scen_df["Total_ROW_Width"] + scen_df["Unused_ROW_Width"]) - \
                                         (scen_df["Left_Sidewalk_Width"] + scen_df["Right_Sidewalk_Width"])
 
@@ -428,21 +510,54 @@ class shared_row_data_evaluator(object):
         scenario keys will be cast as strings and have spaces replaced with underscores, and made into a prefix for
         the selected columns. Those columns will be concatenated column wise to the main df and returned.
         :param - columns - fields to extract from each scenario df and to add prefixes to the main df for"""
-        temp_dataframe = None
-        for scenario in self.scenario_dfs:
+        extracted_dataframes = []
+        for scenario, scenario_df in self.scenario_dfs.items():
             try:
-                scenario_df = self.scenario_dfs.get(scenario)
                 new_columns = ["{0}_{1}".format(str(scenario).replace(" ", "_"), i) for i in columns]
-                extracted_columns = scenario_df[columns]
+                extracted_columns = scenario_df[columns].copy()
                 extracted_columns.columns = new_columns
-                if extracted_columns is not None and temp_dataframe is None:
-                    temp_dataframe = extracted_columns
-                    temp_dataframe.columns = new_columns
-                else:
-                    temp_dataframe = pd.concat([temp_dataframe, extracted_columns], axis=1)
+                extracted_dataframes.append(extracted_columns)
             except:
                 print("Could not process columns for scenario {0}.".format(scenario))
-        return temp_dataframe
+        # the scenarios' columns are concatenated once, instead of once per scenario
+        if not extracted_dataframes:
+            return None
+        return pd.concat(extracted_dataframes, axis=1)
+
+def get_line_end_points(in_fc):
+    '''Reads the first and last points of every feature of a line feature class in one call by exploding the
+    features to their vertices with arcpy.da.FeatureClassToNumPyArray.
+    :param in_fc: path to input line feature class
+    :returns: tuple of (OIDs, first point XY, last point XY) arrays with one row per feature'''
+    vertices = arcpy.da.FeatureClassToNumPyArray(in_fc, ['OID@', 'SHAPE@XY'], explode_to_points=True)
+    oids = vertices['OID@']
+    xy = vertices['SHAPE@XY']
+    # The vertices of a feature are consecutive, so each run of an OID starts at its first point and ends at its last
+    starts = np.flatnonzero(np.r_[True, oids[1:] != oids[:-1]])
+    ends = np.r_[starts[1:], len(oids)] - 1
+    return oids[starts], xy[starts], xy[ends]
+
+def distinct_end_points(in_fc, dx, dy):
+    '''Returns a boolean array that is True for the features whose first and last points are further apart than the
+    XY tolerance of the feature class, like arcpy.Point.equals would tell them apart.
+    :param in_fc: path to input line feature class
+    :param dx: array of x differences between the last and first points
+    :param dy: array of y differences between the last and first points'''
+    tolerance = np.nan_to_num(arcpy.Describe(in_fc).spatialReference.XYTolerance)
+    return (np.abs(dx) > tolerance) | (np.abs(dy) > tolerance)
+
+def write_values_to_field(in_fc, oids, values, out_field):
+    '''Writes an array of values to an existing field for the given OIDs in one arcpy.da.UpdateCursor pass, looking
+    each row's value up in an OID:value dict (ExtendTable only adds new fields, so it cannot fill an existing one).
+    :param in_fc: path to input feature class
+    :param oids: array of OIDs of the features to update
+    :param values: array of values to write, in the same order as oids
+    :param out_field: name of the existing field to write to'''
+    value_dict = dict(zip(np.asarray(oids).tolist(), np.asarray(values).tolist()))
+    with arcpy.da.UpdateCursor(in_fc, ['OID@', out_field]) as cursor:
+        for oid, value in cursor:
+            if oid in value_dict:
+                cursor.updateRow((oid, value_dict[oid]))
 
 def calculate_line_bearing(in_fc, out_field='bearing', azimuth=False):
     '''Given a line feature class, calculates the bearing of the Euclidean 
@@ -454,42 +569,30 @@ def calculate_line_bearing(in_fc, out_field='bearing', azimuth=False):
     :param out_field: name of field to contain bearing data (default 'bearing')
     :param azimuth: whether to convert bearings from trigonometric angles to 
         azimuths (default False)'''
-    # Instantiate a dict we can return
-    out_dict = {}
-
     # Create necessary new fields
     add_new_field(in_fc, out_field, 'DOUBLE')
 
-    # Traverse features via UpdateCursor
-    with arcpy.da.UpdateCursor(in_fc, ['OID@', 'SHAPE@', out_field]) as cursor:
-        for row in cursor:
-            # Extract first and last points
-            first_point = row[1].firstPoint
-            last_point = row[1].lastPoint
-            
-            # Skip features whose first point and last point are identical
-            # (we cannot calculate bearing or sinuosity in this case)
-            if first_point.equals(last_point):
-                continue
-
-            # Calculate bearing via arctangent
-            dx = last_point.X - first_point.X
-            dy = last_point.Y - first_point.Y
-            rads = math.atan2(dy, dx)
-            angle = math.degrees(rads)
-            if azimuth:
-                angle = convert_to_azimuth(angle)
-
-            # Add to dict
-            out_dict[row[0]] = angle
-
-            # Update this feature
-            row[2] = angle
-            cursor.updateRow(row)
-        arc_print("Updated line feature class bearing field.")
-    
+    # Extract first and last points of all features
+    oids, first_points, last_points = get_line_end_points(in_fc)
+    dx = last_points[:, 0] - first_points[:, 0]
+    dy = last_points[:, 1] - first_points[:, 1]
+
+    # Skip features whose first point and last point are identical within the XY tolerance
+    # (we cannot calculate bearing or sinuosity in this case)
+    distinct = distinct_end_points(in_fc, dx, dy)
+    oids, dx, dy = oids[distinct], dx[distinct], dy[distinct]
+
+    # Calculate bearing via arctangent
+    angles = np.degrees(np.arctan2(dy, dx))
+    if azimuth:
+        angles = convert_to_azimuth(angles)
+
+    # Update all features at once
+    write_values_to_field(in_fc, oids, angles, out_field)
+    arc_print("Updated line feature class bearing field.")
+
     # Return populated dict of OID:bearing pairs
-    return out_dict
+    return dict(zip(oids.tolist(), angles.tolist()))
 
 def calculate_line_sinuosity(in_fc, out_field='sinuosity'):
     '''Given a line feature class, calculates the sinuosity of each feature
@@ -500,54 +603,45 @@ def calculate_line_sinuosity(in_fc, out_field='sinuosity'):
     of OID:sinuosity key:value pairs.
     :param in_fc: path to input line feature class
     :param out_field: name of field to contain sinuosity data (default 'sinuosity')'''
-    # Instantiate a dict we can return
-    out_dict = {}
-
     # Create necessary new fields
     add_new_field(in_fc, out_field, 'DOUBLE')
 
-    # Traverse features via UpdateCursor
-    with arcpy.da.UpdateCursor(in_fc, ['OID@', 'SHAPE@', out_field]) as cursor:
-        for row in cursor:
-            # Extract first and last points
-            first_point = row[1].firstPoint
-            last_point = row[1].lastPoint
-            
-            # Skip features whose first point and last point are identical
-            # (we cannot calculate bearing or sinuosity in this case)
-            if first_point.equals(last_point):
-                continue
-
-            # Calculate sinuosity via Pythagorean theorem
-            dx = last_point.X - first_point.X
-            dy = last_point.Y - first_point.Y
-            direct_distance = (dx**2 + dy**2)**0.5
-            sinuosity = row[1].length / direct_distance
-
-            # Add to dict
-            out_dict[row[0]] = sinuosity
-
-            # Update this feature
-            row[2] = sinuosity
-            cursor.updateRow(row)
-        arc_print("Updated line feature class sinuosity field.")
-    
+    # Extract first and last points and lengths of all features
+    oids, first_points, last_points = get_line_end_points(in_fc)
+    lengths = arcpy.da.FeatureClassToNumPyArray(in_fc, ['OID@', 'SHAPE@LENGTH'])
+    lengths = pd.Series(lengths['SHAPE@LENGTH'], index=lengths['OID@']).reindex(oids).to_numpy()
+    dx = last_points[:, 0] - first_points[:, 0]
+    dy = last_points[:, 1] - first_points[:, 1]
+
+    # Skip features whose first point and last point are identical within the XY tolerance
+    # (we cannot calculate bearing or sinuosity in this case)
+    distinct = distinct_end_points(in_fc, dx, dy)
+    oids, dx, dy, lengths = oids[distinct], dx[distinct], dy[distinct], lengths[distinct]
+
+    # Calculate sinuosity via Pythagorean theorem
+    direct_distance = np.hypot(dx, dy)
+    sinuosity = lengths / direct_distance
+
+    # Update all features at once
+    write_values_to_field(in_fc, oids, sinuosity, out_field)
+    arc_print("Updated line feature class sinuosity field.")
+
     # Return populated dict of OID:sinuosity pairs
-    return out_dict
+    return dict(zip(oids.tolist(), sinuosity.tolist()))
 
 def find_smallest_angle(angle1, angle2):
     '''Given two angles/azimuths (in degrees), returns the smallest (positive)
-    angle between them (in degrees).'''
-    diff = (angle1 - angle2) % 180
-    diff = min(diff, 180 - diff)
+    angle between them (in degrees). Accepts scalars or numpy arrays of angles.'''
+    diff = np.mod(angle1 - angle2, 180)
+    diff = np.minimum(diff, 180 - diff)
     return diff
 
 def convert_to_azimuth(angle):
     '''Converts a typical trigonometric angle (in degrees, 0 degrees pointing
     rightward along the x-axis, 90 degrees pointing upward along the y-axis) 
     to an azimuth ( [0, 360) degrees, 0 degrees pointing upward along the 
-    y-axis, 90 degrees pointing rightward along the x-axis).'''
-    azimuth = (90 - angle) % 360
+    y-axis, 90 degrees pointing rightward along the x-axis). Accepts scalars or numpy arrays of angles.'''
+    azimuth = np.mod(90 - angle, 360)
     return azimuth
 
 # End do_analysis function